@@ -0,0 +1,110 @@
+"""Bounded executors for blocking work called from async handlers.
+
+uvicorn runs every request on one event loop, so CPU-heavy or blocking
+library calls (bcrypt, boto3, PIL, the Razorpay SDK) must run elsewhere or
+they stall all other requests. Each kind of work gets its own executor, so
+that a burst of one kind cannot starve the others, and each executor
+reports its queue depth.
+"""
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+
+class ExecutorBusy(Exception):
+    """Raised when an executor's queue is full and the work was not submitted."""
+
+
+class InstrumentedExecutor:
+    """Run blocking callables in a pool with a concurrency limit and queue metrics.
+
+    ``max_workers`` bounds how many calls run at once. Calls beyond that wait
+    in the pool's queue; when ``max_queue`` is positive, a call that would
+    make the queue longer than that raises ExecutorBusy instead of waiting.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = 0, processes: bool = False):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.processes = processes
+        self.in_flight = 0
+        self.peak_queue_depth = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._executor: Executor = None
+
+    @property
+    def executor(self) -> Executor:
+        # Created on first use so that importing the server does not start
+        # worker processes or threads. Processes are spawned rather than
+        # forked because the server already runs other executor threads.
+        if self._executor is None:
+            if self.processes:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.max_workers)
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        if self.max_queue > 0 and self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise ExecutorBusy(f"{self.name} executor queue is full")
+
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+        try:
+            result = await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        self.completed += 1
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "peak_queue_depth": self.peak_queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+_registry: List[InstrumentedExecutor] = []
+
+
+def create_executor(name: str, max_workers: int, max_queue: int = 0, processes: bool = False) -> InstrumentedExecutor:
+    """Create an executor and register it for executor_stats() and shutdown_executors()."""
+    executor = InstrumentedExecutor(name, max_workers, max_queue=max_queue, processes=processes)
+    _registry.append(executor)
+    return executor
+
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    return {executor.name: executor.stats() for executor in _registry}
+
+
+def shutdown_executors() -> None:
+    for executor in _registry:
+        executor.shutdown()
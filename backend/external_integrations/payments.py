@@ -0,0 +1,55 @@
+"""Async wrapper around the Razorpay client used at checkout.
+
+One client is created per process and shares a requests session whose
+connection pool is sized to the executor, so calls reuse kept-alive TLS
+connections instead of handshaking each time. Every call has a connect and
+a read timeout.
+
+Settings (environment):
+    RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET  API credentials
+    RAZORPAY_MAX_CONCURRENCY  concurrent calls and pooled connections (default 10)
+    RAZORPAY_CONNECT_TIMEOUT  seconds to establish a connection (default 5)
+    RAZORPAY_READ_TIMEOUT     seconds to wait for a response (default 15)
+    RAZORPAY_BASE_URL         alternative API base, e.g. a local fake server
+"""
+import os
+from typing import Optional
+
+import razorpay
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class RazorpayGateway:
+    def __init__(self, key_id: str, key_secret: str, executor, base_url: Optional[str] = None,
+                 connect_timeout: float = 5, read_timeout: float = 15):
+        self.key_id = key_id
+        self.executor = executor
+        self.timeout = (connect_timeout, read_timeout)
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=executor.max_workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        options = {"base_url": base_url.rstrip("/")} if base_url else {}
+        self.client = razorpay.Client(session=session, auth=(key_id, key_secret), **options)
+
+    @classmethod
+    def from_env(cls, executor) -> "RazorpayGateway":
+        return cls(
+            key_id=os.environ['RAZORPAY_KEY_ID'],
+            key_secret=os.environ['RAZORPAY_KEY_SECRET'],
+            executor=executor,
+            base_url=os.environ.get('RAZORPAY_BASE_URL') or None,
+            connect_timeout=float(os.environ.get('RAZORPAY_CONNECT_TIMEOUT', 5)),
+            read_timeout=float(os.environ.get('RAZORPAY_READ_TIMEOUT', 15)),
+        )
+
+    async def create_order(self, amount: int, currency: str = "INR", receipt: Optional[str] = None) -> dict:
+        """Create a Razorpay order for amount (in paise) with automatic capture."""
+        data = {"amount": amount, "currency": currency, "payment_capture": 1}
+        if receipt:
+            data["receipt"] = receipt
+        return await self.executor.run(self.client.order.create, data, timeout=self.timeout)
+
+    def close(self) -> None:
+        self.client.session.close()
@@ -0,0 +1,94 @@
+"""Async wrapper around the S3 bucket that stores product images.
+
+One long-lived boto3 client is shared by all calls; its urllib3 pool is
+sized to the executor so concurrent uploads reuse connections rather than
+opening a fresh TLS session each time.
+
+Settings (environment):
+    S3_MAX_CONCURRENCY   concurrent S3 calls and pooled connections (default 10)
+    S3_CONNECT_TIMEOUT   seconds to establish a connection (default 5)
+    S3_READ_TIMEOUT      seconds to wait for a response (default 30)
+    S3_MAX_ATTEMPTS      attempts per call, including retries (default 3)
+    S3_ENDPOINT_URL      alternative endpoint, e.g. a local moto server
+    S3_PUBLIC_URL_BASE   base for public object URLs (default: the AWS bucket URL)
+"""
+import logging
+import os
+from typing import Iterable, List, Optional
+
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger(__name__)
+
+# DeleteObjects accepts at most this many keys per request.
+DELETE_BATCH_SIZE = 1000
+
+
+class S3Storage:
+    def __init__(self, bucket: str, region: str, executor, client=None,
+                 public_url_base: Optional[str] = None):
+        self.bucket = bucket
+        self.region = region
+        self.executor = executor
+        self.client = client
+        self.public_url_base = (public_url_base or f"https://{bucket}.s3.{region}.amazonaws.com").rstrip("/") + "/"
+
+    @classmethod
+    def from_env(cls, executor) -> "S3Storage":
+        config = Config(
+            region_name=os.environ['AWS_REGION'],
+            max_pool_connections=executor.max_workers,
+            connect_timeout=float(os.environ.get('S3_CONNECT_TIMEOUT', 5)),
+            read_timeout=float(os.environ.get('S3_READ_TIMEOUT', 30)),
+            retries={"max_attempts": int(os.environ.get('S3_MAX_ATTEMPTS', 3)), "mode": "standard"},
+        )
+        client = boto3.client(
+            's3',
+            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+            endpoint_url=os.environ.get('S3_ENDPOINT_URL') or None,
+            config=config,
+        )
+        return cls(
+            bucket=os.environ['AWS_BUCKET_NAME'],
+            region=os.environ['AWS_REGION'],
+            executor=executor,
+            client=client,
+            public_url_base=os.environ.get('S3_PUBLIC_URL_BASE'),
+        )
+
+    def public_url(self, key: str) -> str:
+        return f"{self.public_url_base}{key}"
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        """Return the object key for a URL in this bucket, or None for any other URL."""
+        if url and url.startswith(self.public_url_base):
+            return url[len(self.public_url_base):]
+        return None
+
+    async def put_object(self, key: str, body: bytes, content_type: str = 'image/jpeg') -> str:
+        """Upload body under key and return its public URL."""
+        await self.executor.run(
+            self.client.put_object, Bucket=self.bucket, Key=key, Body=body, ContentType=content_type
+        )
+        return self.public_url(key)
+
+    async def delete_object(self, key: str) -> None:
+        await self.executor.run(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def delete_objects(self, keys: Iterable[str]) -> List[str]:
+        """Delete keys with batched DeleteObjects calls, returning keys that failed."""
+        keys = list(dict.fromkeys(keys))
+        failed = []
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            batch = keys[start:start + DELETE_BATCH_SIZE]
+            response = await self.executor.run(
+                self.client.delete_objects,
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+            for error in response.get("Errors", []):
+                logger.error("S3 delete failed for %s: %s", error.get("Key"), error.get("Message"))
+                failed.append(error.get("Key"))
+        return failed
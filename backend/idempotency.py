@@ -0,0 +1,97 @@
+"""Idempotency-Key support for retried POST requests.
+
+A client that sends ``Idempotency-Key: <key>`` gets the response of the first
+request made with that key for as long as the key is kept, without the work
+being done again. Records live in the ``idempotency_keys`` collection,
+unique per (user, route, key) and removed by a TTL index once they expire.
+
+The unique index is what makes concurrent duplicates safe: exactly one
+request claims a key with its insert; the others find the claim and either
+replay the stored response or, while the first is still running, are told
+to retry. A claim whose holder died is taken over once its lock expires.
+A request that fails releases its claim so the client can retry it. Each
+claim carries a random token, and only its holder can complete or release
+it, so a holder that outlived its lock cannot overwrite or delete the claim
+of the request that took over.
+"""
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Optional, Tuple
+
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+IDEMPOTENCY_TTL = timedelta(seconds=float(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 3600)))
+# How long a claim blocks duplicates before another request may take it over
+IDEMPOTENCY_LOCK = timedelta(seconds=float(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 60)))
+MAX_KEY_LENGTH = 255
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+
+def fingerprint(payload: Any) -> str:
+    """Hash of a request payload, to reject a key reused for a different request."""
+    if isinstance(payload, BaseModel):
+        payload = payload.model_dump()
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def claim_key(db, user_id: str, route: str, key: str, request_hash: str) -> Tuple[Optional[str], Optional[dict]]:
+    """Claim key for this request.
+
+    Returns ``(claim, None)`` when the caller now owns the key and must do the
+    work, passing ``claim`` to complete_key or release_key afterwards, or
+    ``(None, record)`` with the existing record when another request got
+    there first.
+    """
+    scope = {"user_id": user_id, "route": route, "key": key}
+    while True:
+        now = datetime.utcnow()
+        claim = {
+            "claim": uuid.uuid4().hex,
+            "request_hash": request_hash,
+            "state": IN_PROGRESS,
+            "locked_until": now + IDEMPOTENCY_LOCK,
+            "created_at": now,
+            "expires_at": now + IDEMPOTENCY_TTL,
+        }
+        try:
+            await db.idempotency_keys.insert_one({**scope, **claim})
+            return claim["claim"], None
+        except DuplicateKeyError:
+            pass
+
+        # Take over a claim that was abandoned mid-request or has expired but
+        # not yet been removed by the TTL monitor
+        taken = await db.idempotency_keys.find_one_and_update(
+            {**scope, "$or": [
+                {"state": IN_PROGRESS, "locked_until": {"$lt": now}},
+                {"expires_at": {"$lt": now}},
+            ]},
+            {"$set": claim, "$unset": {"status_code": "", "body": ""}},
+            return_document=ReturnDocument.AFTER
+        )
+        if taken is not None:
+            return claim["claim"], None
+        record = await db.idempotency_keys.find_one(scope, {"_id": 0})
+        if record is not None:
+            return None, record
+        # The holder released the key after our insert failed; try again
+
+
+async def complete_key(db, user_id: str, route: str, key: str, claim: str, status_code: int, body: bytes) -> None:
+    """Store the response, unless the claim was taken over in the meantime."""
+    await db.idempotency_keys.update_one(
+        {"user_id": user_id, "route": route, "key": key, "claim": claim},
+        {"$set": {"state": COMPLETED, "status_code": status_code, "body": body}}
+    )
+
+
+async def release_key(db, user_id: str, route: str, key: str, claim: str) -> None:
+    """Delete the claim, unless it was taken over in the meantime."""
+    await db.idempotency_keys.delete_one({"user_id": user_id, "route": route, "key": key, "claim": claim})
@@ -0,0 +1,73 @@
+"""Responsive image variants for uploaded product images.
+
+render_variants() decodes an upload once and encodes every size the
+storefront needs, so the product grid can load a small card image instead
+of the full-size original. It is CPU-bound and runs in a process pool;
+keep it a plain top-level function so it can be pickled.
+
+Each size is produced as JPEG plus WebP, and AVIF for the full size when
+the installed Pillow has an AVIF encoder.
+"""
+import io
+from typing import Dict, NamedTuple
+
+from PIL import Image, ImageOps, features
+
+# Part of every stored key; bump it when SIZES or encoder settings change so
+# that re-uploads render fresh variants instead of reusing stored ones.
+PIPELINE_VERSION = 1
+
+# name -> (longest edge in pixels, JPEG quality)
+SIZES = {
+    "thumbnail": (320, 80),
+    "card": (800, 82),
+    "full": (2000, 90),
+}
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+
+
+class ImageDecodeError(ValueError):
+    """The upload is not an image Pillow can read."""
+
+
+class Variant(NamedTuple):
+    data: bytes
+    content_type: str
+    extension: str
+
+
+def _encode(image: Image.Image, format: str, **options) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format=format, **options)
+    return output.getvalue()
+
+
+def render_variants(content: bytes) -> Dict[str, Variant]:
+    """Return variants keyed by name, e.g. "card" (JPEG) and "card_webp".
+
+    The "full" JPEG is always present and is what callers should use as the
+    image's primary URL.
+    """
+    # Pillow decodes lazily, so truncated data only fails once pixels are read
+    try:
+        image = Image.open(io.BytesIO(content))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ImageDecodeError(str(e)) from None
+
+    avif = features.check("avif")
+    variants = {}
+    for name, (edge, quality) in SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        variants[name] = Variant(_encode(resized, 'JPEG', quality=quality, optimize=True, progressive=True),
+                                 'image/jpeg', 'jpg')
+        variants[f"{name}_webp"] = Variant(_encode(resized, 'WEBP', quality=WEBP_QUALITY, method=4),
+                                           'image/webp', 'webp')
+        if avif and name == "full":
+            variants[f"{name}_avif"] = Variant(_encode(resized, 'AVIF', quality=AVIF_QUALITY),
+                                               'image/avif', 'avif')
+    return variants
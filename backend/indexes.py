@@ -0,0 +1,174 @@
+"""Declarative MongoDB index registry.
+
+Every index the API relies on is declared in ``INDEXES``. The server
+reconciles them on startup with ``create_indexes``; creating an index that
+already exists with the same spec is a no-op, so this is safe on every boot.
+
+Run ``python indexes.py apply`` to build indexes ahead of a deploy, or
+``python indexes.py report`` to list registry indexes that are missing from
+the database, indexes the registry does not know about, and indexes that
+have not served a single operation since the server last restarted.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "categories": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "subcategories": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("category_id", ASCENDING)], name="category_id"),
+    ],
+    "sizes": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("category_id", ASCENDING)], name="category_id"),
+    ],
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        IndexModel(
+            [("category_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+            name="category_created_at_id",
+        ),
+        IndexModel(
+            [("subcategory_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+            name="subcategory_created_at_id",
+        ),
+    ],
+    "cart_items": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # One line per (user, product, size); add-to-cart upserts rely on it
+        IndexModel(
+            [("user_id", ASCENDING), ("product_id", ASCENDING), ("size", ASCENDING)],
+            name="user_product_size_unique",
+            unique=True,
+        ),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_created_at"),
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+    ],
+    "image_variants": [
+        IndexModel([("url", ASCENDING)], name="url_unique", unique=True),
+    ],
+    "hero_images": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("is_active", ASCENDING)], name="is_active"),
+        IndexModel([("image_url", ASCENDING)], name="image_url"),
+    ],
+    "idempotency_keys": [
+        IndexModel(
+            [("user_id", ASCENDING), ("route", ASCENDING), ("key", ASCENDING)],
+            name="user_route_key_unique",
+            unique=True,
+        ),
+        # Removes records once expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Indexes the registry no longer wants, dropped before it is applied: ones
+# superseded by an entry on the same keys (MongoDB will not keep two indexes
+# with one key pattern) and ones nothing queries any more.
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    "cart_items": ["user_product_size"],
+    # Multikey over image URLs, which can be multi-megabyte data: URLs;
+    # image_variants records track which products use an upload instead
+    "products": ["images"],
+}
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Drop retired indexes, then create every registry index.
+
+    Returns the created index names per collection.
+
+    A collection whose indexes cannot be built (for example, a unique index
+    over data that already has duplicates) is logged and skipped so that one
+    bad collection does not keep the API from starting.
+    """
+    created = {}
+    for collection, names in RETIRED_INDEXES.items():
+        existing = await db[collection].index_information()
+        for name in names:
+            if name in existing:
+                await db[collection].drop_index(name)
+                logger.info("Dropped retired index %s.%s", collection, name)
+    for collection, models in INDEXES.items():
+        try:
+            created[collection] = await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            logger.error("Index build failed on %s: %s", collection, e)
+    return created
+
+
+async def _index_usage(collection) -> Dict[str, int]:
+    """Return operations served per index name, or {} if $indexStats is unavailable."""
+    try:
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(None)
+    except OperationFailure:
+        return {}
+    return {stat["name"]: int(stat.get("accesses", {}).get("ops", 0)) for stat in stats}
+
+
+async def index_report(db) -> Dict[str, Dict[str, Any]]:
+    """Compare the registry with the live database.
+
+    For each collection reports ``missing`` (declared but not built),
+    ``unexpected`` (built but not declared) and ``unused`` (built but with
+    zero recorded operations; counters reset when mongod restarts).
+    """
+    report = {}
+    for collection, models in INDEXES.items():
+        declared = {model.document["name"] for model in models}
+        existing = {index["name"] async for index in db[collection].list_indexes()}
+        existing.discard("_id_")
+        usage = await _index_usage(db[collection])
+        report[collection] = {
+            "missing": sorted(declared - existing),
+            "unexpected": sorted(existing - declared),
+            "unused": sorted(name for name in existing if usage.get(name) == 0),
+        }
+    return report
+
+
+async def _main(command: str):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if command == "apply":
+            result = await ensure_indexes(db)
+        else:
+            result = await index_report(db)
+        print(json.dumps(result, indent=2))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the API's MongoDB indexes")
+    parser.add_argument("command", choices=["apply", "report"])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args.command))
@@ -0,0 +1,170 @@
+"""Prometheus metrics for the API, served at ``/metrics``.
+
+- HTTP: request counts by route template and status, latency histograms and
+  in-flight gauges per route, recorded by MetricsMiddleware. Routes are
+  labelled by their template (``/api/products/{product_id}``), never the raw
+  path, so label cardinality stays bounded.
+- MongoDB: command latency per command and collection, from a pymongo
+  command listener registered on the Motor client.
+- S3: call latency per operation and HTTP status, from botocore events.
+- Executors: in-flight work and queue depth per executor, read at scrape time.
+"""
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+from starlette.responses import Response
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status code", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte", ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled", ["method", "route"])
+
+MONGO_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ["command", "collection"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+MONGO_FAILURES = Counter("mongo_command_failures_total", "MongoDB commands that failed", ["command", "collection"])
+
+S3_LATENCY = Histogram(
+    "s3_request_duration_seconds", "S3 API call latency, including retries", ["operation", "status"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+# "METHOD /route/{template}" of the request being handled, for code that
+# needs to attribute work to a route (e.g. the slow-query log)
+request_route: ContextVar[Optional[str]] = ContextVar("request_route", default=None)
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, routes: List[BaseRoute]):
+        self.app = app
+        self.routes = routes
+
+    def route_template(self, scope: Scope) -> str:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", UNMATCHED_ROUTE)
+        return UNMATCHED_ROUTE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self.route_template(scope)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        request_route.set(f"{method} {route}")
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the driver sends. Pass it in the client's event_listeners."""
+
+    # Commands that name their collection somewhere other than their first field
+    _COLLECTION_FIELD = {"getMore": "collection"}
+
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+
+    @staticmethod
+    def _key(event) -> tuple:
+        return (event.connection_id, event.request_id)
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        field = self._COLLECTION_FIELD.get(event.command_name, event.command_name)
+        collection = event.command.get(field)
+        self._collections[self._key(event)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        collection = self._collections.pop(self._key(event), "")
+        MONGO_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self._collections.pop(self._key(event), "")
+        MONGO_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_FAILURES.labels(event.command_name, collection).inc()
+
+
+def instrument_boto_client(client) -> None:
+    """Record the latency of every API call the boto3 client makes."""
+    service = client.meta.service_model.endpoint_prefix
+
+    def before_call(context, **kwargs):
+        context["metrics_started"] = time.perf_counter()
+
+    def after_call(model, context, http_response, **kwargs):
+        started = context.get("metrics_started")
+        if started is not None:
+            status = str(getattr(http_response, "status_code", "error"))
+            S3_LATENCY.labels(model.name, status).observe(time.perf_counter() - started)
+
+    client.meta.events.register(f"before-call.{service}", before_call)
+    client.meta.events.register(f"after-call.{service}", after_call)
+
+
+class ExecutorCollector:
+    """Reports executor_stats() at scrape time."""
+
+    def __init__(self, stats: Callable[[], Dict[str, dict]]):
+        self.stats = stats
+
+    def collect(self):
+        gauges = {
+            "in_flight": GaugeMetricFamily("executor_in_flight", "Calls submitted and not finished", labels=["executor"]),
+            "queue_depth": GaugeMetricFamily("executor_queue_depth", "Calls waiting for a worker", labels=["executor"]),
+            "max_workers": GaugeMetricFamily("executor_max_workers", "Worker limit", labels=["executor"]),
+        }
+        counters = {
+            "completed": CounterMetricFamily("executor_completed", "Calls that finished", labels=["executor"]),
+            "failed": CounterMetricFamily("executor_failed", "Calls that raised", labels=["executor"]),
+            "rejected": CounterMetricFamily("executor_rejected", "Calls refused because the queue was full",
+                                            labels=["executor"]),
+        }
+        for name, stats in self.stats().items():
+            for field, family in {**gauges, **counters}.items():
+                family.add_metric([name], stats[field])
+        yield from gauges.values()
+        yield from counters.values()
+
+
+_executor_collector: Optional[ExecutorCollector] = None
+
+
+def register_executor_metrics(stats: Callable[[], Dict[str, dict]]) -> None:
+    global _executor_collector
+    if _executor_collector is None:
+        _executor_collector = ExecutorCollector(stats)
+        REGISTRY.register(_executor_collector)
+
+
+def metrics_response() -> Response:
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,151 @@
+"""In-memory inverted index for product search.
+
+Products are tokenized into lower-cased word terms. A query matches a
+product only when every query term matches one of its terms, either exactly
+or as a prefix, so "cot shi" finds "Custom Cotton T-Shirt". Results are
+ranked by a TF-IDF style score in which title terms outweigh description
+terms and exact matches outweigh prefix matches.
+
+Queries go through the same tokenizer as documents, so user input is never
+interpreted as a regex or a Mongo operator.
+
+The index lives in the API process. It is built from the products
+collection on first use and kept current by the product write endpoints,
+which assumes a single uvicorn worker. With more workers, each one only
+sees its own writes until its next rebuild().
+"""
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from heapq import merge
+from typing import Dict, Iterable, List, Optional, Set
+
+_TOKEN_RE = re.compile(r"\w+")
+
+FIELD_WEIGHTS = {"title": 3.0, "description": 1.0}
+PREFIX_MATCH_WEIGHT = 0.5
+MAX_QUERY_TERMS = 16
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into case- and accent-insensitive word terms."""
+    if not text:
+        return []
+    normalized = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(ch for ch in normalized if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(stripped)
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self.ready = False
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._terms: List[str] = []
+        self._doc_terms: Dict[str, Set[str]] = {}
+        self._doc_filters: Dict[str, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def rebuild(self, products: Iterable[dict]) -> None:
+        """Replace the whole index with the given products."""
+        self._postings = defaultdict(dict)
+        self._terms = []
+        self._doc_terms = {}
+        self._doc_filters = {}
+        self.add_many(products)
+        self.ready = True
+
+    def add(self, product: dict) -> None:
+        """Index a product, replacing any previous version of it."""
+        for term in self._index(product):
+            insort(self._terms, term)
+
+    def add_many(self, products: Iterable[dict]) -> None:
+        """Index several products, merging their new terms into the sorted term list once."""
+        new_terms: Set[str] = set()
+        for product in products:
+            new_terms.update(self._index(product))
+        # A product listed twice may have dropped a term its first version added
+        new_terms.intersection_update(self._postings)
+        if new_terms:
+            self._terms = list(merge(self._terms, sorted(new_terms)))
+
+    def _index(self, product: dict) -> List[str]:
+        """Add a product's postings; returns the terms that were not yet in the index."""
+        product_id = product["id"]
+        self.remove(product_id)
+
+        weights: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(product.get(field)):
+                weights[term] += weight
+
+        new_terms = []
+        for term, weight in weights.items():
+            if term not in self._postings:
+                new_terms.append(term)
+            self._postings[term][product_id] = weight
+        self._doc_terms[product_id] = set(weights)
+        self._doc_filters[product_id] = {
+            "category_id": product.get("category_id"),
+            "subcategory_id": product.get("subcategory_id"),
+        }
+        return new_terms
+
+    def remove(self, product_id: str) -> None:
+        for term in self._doc_terms.pop(product_id, ()):
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                index = bisect_left(self._terms, term)
+                if index < len(self._terms) and self._terms[index] == term:
+                    del self._terms[index]
+        self._doc_filters.pop(product_id, None)
+
+    def _expand(self, query_term: str) -> Dict[str, float]:
+        """Return index terms matching query_term with their match weight."""
+        matches = {}
+        index = bisect_left(self._terms, query_term)
+        while index < len(self._terms) and self._terms[index].startswith(query_term):
+            term = self._terms[index]
+            matches[term] = 1.0 if term == query_term else PREFIX_MATCH_WEIGHT
+            index += 1
+        return matches
+
+    def search(self, query: str, category_id: Optional[str] = None,
+               subcategory_id: Optional[str] = None) -> List[str]:
+        """Return ids of products matching every query term, best first."""
+        query_terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        if not query_terms:
+            return []
+
+        total_docs = len(self._doc_terms)
+        scores: Optional[Dict[str, float]] = None
+        for query_term in query_terms:
+            term_scores: Dict[str, float] = defaultdict(float)
+            for term, match_weight in self._expand(query_term).items():
+                postings = self._postings[term]
+                idf = math.log(1 + total_docs / len(postings))
+                for product_id, weight in postings.items():
+                    term_scores[product_id] = max(term_scores[product_id], weight * match_weight * idf)
+            if scores is None:
+                scores = dict(term_scores)
+            else:
+                scores = {pid: score + term_scores[pid] for pid, score in scores.items() if pid in term_scores}
+            if not scores:
+                return []
+
+        ranked = []
+        for product_id, score in scores.items():
+            filters = self._doc_filters[product_id]
+            if category_id and filters["category_id"] != category_id:
+                continue
+            if subcategory_id and filters["subcategory_id"] != subcategory_id:
+                continue
+            ranked.append((-score, product_id))
+        ranked.sort()
+        return [product_id for _, product_id in ranked]
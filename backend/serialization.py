@@ -0,0 +1,66 @@
+"""Fast JSON path for read-heavy list endpoints.
+
+Returning Pydantic models from a route makes FastAPI validate and encode
+every object a second time against ``response_model``. For documents that
+were written through those same models, that work buys nothing. Here
+documents are fetched with a projection of the model's fields, missing
+fields get the model's defaults, and the result is dumped straight to bytes
+with orjson (stdlib json when orjson is not installed).
+
+Routes keep declaring ``response_model`` so the OpenAPI schema is unchanged.
+"""
+import json
+from copy import copy
+from datetime import date, datetime
+from typing import Any, Dict, Type
+
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+_field_defaults: Dict[Type[BaseModel], list] = {}
+
+
+def projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """Mongo projection selecting exactly the model's fields."""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+
+def _defaults(model: Type[BaseModel]) -> list:
+    if model not in _field_defaults:
+        _field_defaults[model] = [
+            (name, field.default, field.default_factory) for name, field in model.model_fields.items()
+        ]
+    return _field_defaults[model]
+
+
+def to_schema(document: dict, model: Type[BaseModel]) -> dict:
+    """Shape a stored document like model(**document).model_dump() would, without validation."""
+    shaped = {}
+    for name, default, factory in _defaults(model):
+        if name in document:
+            shaped[name] = document[name]
+        elif factory is not None:
+            shaped[name] = factory()
+        elif default is not PydanticUndefined:
+            shaped[name] = copy(default) if isinstance(default, (list, dict)) else default
+    return shaped
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
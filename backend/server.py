@@ -1,50 +1,122 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Query, Request, status
+from fastapi.exception_handlers import http_exception_handler
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from pathlib import Path
 import os
+import asyncio
 import logging
 import uuid
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
-import boto3
-from botocore.exceptions import ClientError
-from pydantic import BaseModel, Field, EmailStr
+from typing import List, Optional, Dict, Any, Tuple, Union
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pydantic import BaseModel, Field, EmailStr, ValidationError
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 import json
-from PIL import Image
+import base64
+import csv
+import hashlib
 import io
+import requests
 import razorpay
+from indexes import ensure_indexes
+from cache import TTLCache
+from search_index import ProductSearchIndex
+from stats import increment_stats, read_stats, rebuild_stats
+from idempotency import COMPLETED, MAX_KEY_LENGTH, claim_key, complete_key, fingerprint, release_key
+from executors import ExecutorBusy, create_executor, executor_stats, shutdown_executors
+from external_integrations.storage import S3Storage
+from external_integrations.payments import RazorpayGateway
+from image_pipeline import PIPELINE_VERSION, ImageDecodeError, render_variants
+from compression import CompressionMiddleware
+from serialization import dumps, projection, to_schema
+from metrics import (MetricsMiddleware, MongoCommandMetrics, instrument_boto_client, metrics_response,
+                     register_executor_metrics)
+from slow_queries import SlowQueryLog
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+slow_queries = SlowQueryLog.from_env(ROOT_DIR)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics(), slow_queries])
 db = client[os.environ['DB_NAME']]
 
-# AWS S3 configuration
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-    aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
-    region_name=os.environ['AWS_REGION']
+# AWS S3 configuration; boto3 calls run on their own executor
+s3_executor = create_executor("s3", max_workers=int(os.environ.get('S3_MAX_CONCURRENCY', 10)))
+storage = S3Storage.from_env(s3_executor)
+instrument_boto_client(storage.client)
+
+# Image decoding and encoding is CPU-bound and runs in worker processes
+image_executor = create_executor(
+    "images", max_workers=int(os.environ.get('IMAGE_PROCESS_WORKERS', 2)), processes=True
 )
 
+# Bulk import parsing and validation, one batch at a time per import
+import_executor = create_executor("import", max_workers=int(os.environ.get('IMPORT_MAX_CONCURRENCY', 2)))
+
+# Razorpay client with a pooled session, created once; SDK calls run on their own executor
+payment_executor = create_executor("razorpay", max_workers=int(os.environ.get('RAZORPAY_MAX_CONCURRENCY', 10)))
+payments = RazorpayGateway.from_env(payment_executor)
+
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 JWT_SECRET_KEY = os.environ['JWT_SECRET_KEY']
 JWT_ALGORITHM = os.environ['JWT_ALGORITHM']
 
+# bcrypt work runs off the event loop so a login burst cannot stall other requests
+password_executor = create_executor(
+    "password-hash",
+    max_workers=int(os.environ.get('PASSWORD_HASH_CONCURRENCY', 2)),
+    max_queue=int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 0)),
+)
+
+# Authenticated principals, so most requests skip the users lookup.
+# Call principal_cache.invalidate(user_id) after changing a user's role or profile.
+principal_cache = TTLCache(
+    max_size=int(os.environ.get('PRINCIPAL_CACHE_MAX_SIZE', 10000)),
+    ttl=float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', 60)),
+)
+
+# Pre-serialized taxonomy responses, cleared by the matching admin create endpoint.
+# The TTL only bounds staleness from writes made by other processes.
+TAXONOMY_CACHE_TTL = float(os.environ.get('TAXONOMY_CACHE_TTL_SECONDS', 300))
+taxonomy_caches = {
+    name: TTLCache(max_size=256, ttl=TAXONOMY_CACHE_TTL)
+    for name in ("categories", "subcategories", "sizes", "hero_images")
+}
+
+# Cache-Control per route, overridable with CACHE_CONTROL_<ROUTE> (e.g. CACHE_CONTROL_PRODUCTS).
+# Product routes revalidate on every use; their ETags make that a cheap 304.
+CACHE_CONTROL = {
+    route: os.environ.get(f"CACHE_CONTROL_{route.upper()}", default)
+    for route, default in {
+        "product": "public, no-cache",
+        "products": "public, no-cache",
+        "categories": "public, max-age=60",
+        "subcategories": "public, max-age=60",
+        "sizes": "public, max-age=60",
+        "hero_images": "public, max-age=60",
+    }.items()
+}
+
 # Create the main app
 app = FastAPI(title="IllustraDesign Studio API", version="1.0.0")
 api_router = APIRouter(prefix="/api")
 
+@app.exception_handler(ExecutorBusy)
+async def executor_busy_handler(request: Request, exc: ExecutorBusy):
+    # A full executor queue is load shedding, not a server error: ask the client to retry
+    return await http_exception_handler(request, HTTPException(
+        status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"}))
+
 # CORS should be added before including any routers
 app.add_middleware(
     CORSMiddleware,
@@ -58,12 +130,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON listings for slow mobile connections (brotli when installed, else gzip)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+    gzip_level=int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+    brotli_quality=int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4)),
+)
+
+# Outermost, so request latency includes every other middleware
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+register_executor_metrics(executor_stats)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
+
 # Utility functions
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await password_executor.run(pwd_context.hash, password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_executor.run(pwd_context.verify, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -75,6 +163,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
+def encode_cursor(position: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(position, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -89,44 +189,232 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise credentials_exception
     
-    user = await db.users.find_one({"id": user_id})
+    user = principal_cache.get(user_id)
     if user is None:
-        raise credentials_exception
-    return user
+        user = await db.users.find_one({"id": user_id})
+        if user is None:
+            raise credentials_exception
+        principal_cache.set(user_id, user)
+    return dict(user)
+
+# Product search index, built lazily and updated by the product write endpoints
+product_search = ProductSearchIndex()
+
+async def ensure_search_index():
+    if not product_search.ready:
+        products = await db.products.find(
+            {}, {"_id": 0, "id": 1, "title": 1, "description": 1, "category_id": 1, "subcategory_id": 1}
+        ).to_list(None)
+        product_search.rebuild(products)
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match lists etag (weak comparison, per RFC 9110)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
 
-def upload_to_s3(file_content: bytes, filename: str, folder: str = "products") -> str:
+async def cached_json_response(request: Request, cache_name: str, key: Any, load) -> Response:
+    """Serve a pre-serialized JSON body from a taxonomy cache, loading it on a miss.
+
+    The ETag is a hash of the cached body, so revalidation never re-serializes.
+    """
+    cache = taxonomy_caches[cache_name]
+    entry = cache.get(key)
+    if entry is None:
+        body = dumps(await load())
+        entry = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        cache.set(key, entry)
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL[cache_name]}
+    if etag_matches(request, etag):
+        return not_modified(headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def product_etag(product: dict) -> str:
+    """Strong ETag from the product's last write time (created_at for older documents)."""
+    stamp = product.get("updated_at") or product["created_at"]
+    return f'"{product["id"]}-{int((stamp - datetime(1970, 1, 1)).total_seconds() * 1000)}"'
+
+async def touch_catalog() -> None:
+    """Rotate the catalog version token after any product write, invalidating listing ETags."""
+    await db.catalog_versions.update_one(
+        {"_id": "products"}, {"$set": {"token": uuid.uuid4().hex[:16]}}, upsert=True
+    )
+
+async def catalog_etag(request: Request) -> str:
+    version = await db.catalog_versions.find_one({"_id": "products"})
+    params = hashlib.sha256(str(sorted(request.query_params.multi_items())).encode()).hexdigest()[:16]
+    return f'"{version["token"] if version else "0"}-{params}"'
+
+# Projections for internal product reads. Descriptions and image lists (which
+# can hold inline data: URLs) are only loaded by callers that return them.
+CART_PRODUCT_FIELDS = {"_id": 0, "id": 1, "title": 1, "price": 1, "images": {"$slice": 1}}
+ORDER_PRODUCT_FIELDS = {"_id": 0, "id": 1, "title": 1, "price": 1}
+RELEASE_PRODUCT_FIELDS = {"_id": 0, "id": 1, "images": 1}
+
+async def idempotent_response(request: Request, route: str, user_id: str, payload: Any, work) -> Any:
+    """Run work() once per Idempotency-Key header and replay its JSON response on repeats.
+
+    Requests without the header just run work(). A key reused with a
+    different payload is rejected, and a repeat that arrives while the first
+    request is still running gets 409 with Retry-After.
+    """
+    key = request.headers.get("idempotency-key")
+    if key is None:
+        return await work()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Invalid Idempotency-Key")
+    
+    request_hash = fingerprint(payload)
+    claim, record = await claim_key(db, user_id, route, key, request_hash)
+    if record is not None:
+        if record["request_hash"] != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if record["state"] != COMPLETED:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress",
+                                headers={"Retry-After": "1"})
+        return Response(content=record["body"], status_code=record["status_code"], media_type="application/json",
+                        headers={"Idempotent-Replayed": "true"})
+    
     try:
-        unique_filename = f"{folder}/{datetime.now().strftime('%Y/%m/%d')}/{uuid.uuid4()}_{filename}"
-        s3_client.put_object(
-            Bucket=os.environ['AWS_BUCKET_NAME'],
-            Key=unique_filename,
-            Body=file_content,
-            ContentType='image/jpeg'
-        )
-        print(f"[S3 UPLOAD SUCCESS] {unique_filename}")
-        return f"https://{os.environ['AWS_BUCKET_NAME']}.s3.{os.environ['AWS_REGION']}.amazonaws.com/{unique_filename}"
-    except ClientError as e:
-        print(f"[S3 UPLOAD ERROR] {e}")
-        # Fallback to local storage if S3 fails
-        try:
-            import base64
-            encoded_image = base64.b64encode(file_content).decode('utf-8')
-            print("[FALLBACK] Returning base64 image string due to S3 error.")
-            return f"data:image/jpeg;base64,{encoded_image}"
-        except Exception as fallback_error:
-            print(f"[FALLBACK ERROR] {fallback_error}")
-            raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)} and fallback failed: {str(fallback_error)}")
+        result = await work()
+    except Exception:
+        # Failed requests are not stored, so the client can retry with the same key
+        await release_key(db, user_id, route, key, claim)
+        raise
+    body = dumps(result)
+    await complete_key(db, user_id, route, key, claim, 200, body)
+    return Response(content=body, media_type="application/json")
+
+async def get_products_by_ids(product_ids: List[str], fields: Optional[Dict[str, Any]] = None) -> Dict[str, dict]:
+    """Fetch many products in one round trip, keyed by product id.
+
+    fields is a Mongo projection; it must include "id".
+    """
+    unique_ids = list(dict.fromkeys(product_ids))
+    if not unique_ids:
+        return {}
+    products = await db.products.find({"id": {"$in": unique_ids}}, fields).to_list(len(unique_ids))
+    return {product["id"]: product for product in products}
+
+async def upload_image_variants(file_content: bytes, folder: str = "products") -> Tuple[str, Dict[str, str]]:
+    """Render responsive variants in the image process pool and upload them to S3.
+
+    Keys are derived from the upload's SHA-256, so uploading the same artwork
+    again returns the stored URLs without processing or transferring anything.
+    Returns the full-size JPEG URL and a map of variant name to URL. If S3 is
+    unavailable, falls back to an inline full-size image with no variants.
+    """
+    content_hash = hashlib.sha256(file_content).hexdigest()
+    base_key = f"{folder}/{content_hash[:2]}/{content_hash}_v{PIPELINE_VERSION}"
+    existing = await db.image_variants.find_one({"url": storage.public_url(f"{base_key}_full.jpg")})
+    if existing:
+        print(f"[S3 UPLOAD SKIPPED] {base_key} already stored")
+        return existing["url"], existing["variants"]
+    
+    try:
+        variants = await image_executor.run(render_variants, file_content)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
+    
+    try:
+        urls = await asyncio.gather(*(
+            storage.put_object(f"{base_key}_{name}.{variant.extension}", variant.data, variant.content_type)
+            for name, variant in variants.items()
+        ))
     except Exception as e:
-        print(f"[S3 UPLOAD GENERAL ERROR] {e}")
-        # Fallback to local storage for any other errors
+        print(f"[S3 UPLOAD ERROR] {e}")
+        # Fallback to an inline image if S3 fails
+        encoded_image = base64.b64encode(variants["full"].data).decode('utf-8')
+        print("[FALLBACK] Returning base64 image string due to S3 error.")
+        return f"data:image/jpeg;base64,{encoded_image}", {}
+    
+    print(f"[S3 UPLOAD SUCCESS] {base_key} ({len(urls)} variants)")
+    variant_urls = dict(zip(variants, urls))
+    try:
+        await db.image_variants.insert_one({
+            "url": variant_urls["full"],
+            "content_hash": content_hash,
+            "variants": variant_urls,
+            "products": [],  # ids of products using this image
+            "created_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        pass  # a concurrent upload of the same content stored identical objects
+    return variant_urls["full"], variant_urls
+
+async def add_image_references(references: Dict[str, List[str]]) -> None:
+    """Record which products use each uploaded image (image URL -> product ids)."""
+    if references:
+        await db.image_variants.bulk_write([
+            UpdateOne({"url": url}, {"$addToSet": {"products": {"$each": product_ids}}})
+            for url, product_ids in references.items()
+        ], ordered=False)
+
+def image_references(products: List["Product"]) -> Dict[str, List[str]]:
+    references: Dict[str, List[str]] = {}
+    for product in products:
+        for entry in product.image_variants:
+            references.setdefault(entry.url, []).append(product.id)
+    return references
+
+async def release_product_images(product_id: str, images: List[str]) -> None:
+    """Drop a product's references to images and delete any image nothing else uses.
+
+    Uploads are content-addressed, so several products (or hero images) can
+    share one stored image. Each upload's image_variants record lists the
+    products using it; the image and its variants are deleted from S3 once
+    that list is empty and no hero image shows it. S3 images without a
+    record predate content addressing and belonged to this product alone.
+    """
+    images = [url for url in dict.fromkeys(images) if storage.key_from_url(url)]
+    if not images:
+        return
+    await db.image_variants.update_many({"url": {"$in": images}}, {"$pull": {"products": product_id}})
+    in_use = set(await db.hero_images.distinct("image_url", {"image_url": {"$in": images}}))
+    recorded = set(await db.image_variants.distinct("url", {"url": {"$in": images}}))
+    
+    image_urls = []
+    for url in images:
+        if url in in_use:
+            continue
+        if url not in recorded:
+            image_urls.append(url)
+            continue
+        # Deleting the record claims the release, so a product that takes a
+        # reference in the meantime keeps the image
+        record = await db.image_variants.find_one_and_delete({"url": url, "products": {"$size": 0}})
+        if record:
+            image_urls.extend([url, *record["variants"].values()])
+    keys = list(dict.fromkeys(key for key in map(storage.key_from_url, image_urls) if key))
+    if keys:
         try:
-            import base64
-            encoded_image = base64.b64encode(file_content).decode('utf-8')
-            print("[FALLBACK] Returning base64 image string due to general error.")
-            return f"data:image/jpeg;base64,{encoded_image}"
-        except Exception as fallback_error:
-            print(f"[FALLBACK ERROR] {fallback_error}")
-            raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)} and fallback failed: {str(fallback_error)}")
+            failed = await storage.delete_objects(keys)
+            print(f"[S3 DELETE SUCCESS] {len(keys) - len(failed)} of {len(keys)} objects")
+        except Exception as e:
+            print(f"[S3 DELETE ERROR] {e}")
+
+async def recorded_variants(urls: List[str]) -> Dict[str, Dict[str, str]]:
+    recorded = {}
+    if urls:
+        async for record in db.image_variants.find({"url": {"$in": urls}}, {"_id": 0, "url": 1, "variants": 1}):
+            recorded[record["url"]] = record["variants"]
+    return recorded
+
+async def attach_image_variants(product: "Product") -> None:
+    """Fill product.image_variants for its images from the recorded uploads."""
+    known = {entry.url: entry for entry in product.image_variants if entry.url in product.images}
+    recorded = await recorded_variants([url for url in product.images if url not in known])
+    product.image_variants = [
+        known.get(url) or ImageVariants(url=url, variants=recorded[url])
+        for url in dict.fromkeys(product.images) if url in known or url in recorded
+    ]
 
 # Data Models
 class User(BaseModel):
@@ -169,6 +457,10 @@ class Size(BaseModel):
     category_id: str
     subcategory_id: Optional[str] = None
 
+class ImageVariants(BaseModel):
+    url: str  # one of the product's images
+    variants: Dict[str, str] = {}  # variant name -> URL
+
 class Product(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     title: str
@@ -178,9 +470,17 @@ class Product(BaseModel):
     price: float
     sizes: List[str] = []
     images: List[str] = []
+    # A list rather than a map keyed by URL: URLs contain dots, which MongoDB
+    # field names cannot safely hold
+    image_variants: List[ImageVariants] = []
     is_customizable: bool = False
     quantity: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = None
+
+class ProductPage(BaseModel):
+    items: List[Product]
+    next_cursor: Optional[str] = None
 
 class ProductCreate(BaseModel):
     title: str
@@ -197,11 +497,22 @@ class CartItem(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
     product_id: str
-    quantity: int
+    quantity: int = Field(..., ge=1)
     size: Optional[str] = None
     custom_image_url: Optional[str] = None
     added_at: datetime = Field(default_factory=datetime.utcnow)
 
+class CartLine(BaseModel):
+    product_id: str
+    quantity: int = Field(1, ge=1)
+    size: Optional[str] = None
+    custom_image_url: Optional[str] = None
+
+CART_BATCH_MAX_LINES = 100
+
+class CartBatch(BaseModel):
+    items: List[CartLine] = Field(..., min_length=1, max_length=CART_BATCH_MAX_LINES)
+
 class Order(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -234,15 +545,19 @@ async def register(user: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password(user.password)
     
     # Create user
     user_dict = user.dict()
     del user_dict['password']
     user_obj = User(**user_dict)
     
-    # Store in database
-    await db.users.insert_one({**user_obj.dict(), "hashed_password": hashed_password})
+    # Store in database; the unique email index catches concurrent registrations
+    try:
+        await db.users.insert_one({**user_obj.dict(), "hashed_password": hashed_password})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    await increment_stats(db, total_users=1)
     
     # Create access token
     access_token = create_access_token(data={"sub": user_obj.id})
@@ -252,7 +567,7 @@ async def register(user: UserCreate):
 @api_router.post("/auth/login")
 async def login(user_data: UserLogin):
     user = await db.users.find_one({"email": user_data.email})
-    if not user or not verify_password(user_data.password, user["hashed_password"]):
+    if not user or not await verify_password(user_data.password, user["hashed_password"]):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     
     access_token = create_access_token(data={"sub": user["id"]})
@@ -275,9 +590,11 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 
 # Category endpoints
 @api_router.get("/categories", response_model=List[Category])
-async def get_categories():
-    categories = await db.categories.find().to_list(1000)
-    return [Category(**category) for category in categories]
+async def get_categories(request: Request):
+    async def load():
+        categories = await db.categories.find({}, projection(Category)).to_list(1000)
+        return [to_schema(category, Category) for category in categories]
+    return await cached_json_response(request, "categories", None, load)
 
 @api_router.post("/categories", response_model=Category)
 async def create_category(category: Category, current_user: dict = Depends(get_current_user)):
@@ -285,14 +602,17 @@ async def create_category(category: Category, current_user: dict = Depends(get_c
         raise HTTPException(status_code=403, detail="Admin access required")
     
     await db.categories.insert_one(category.dict())
+    taxonomy_caches["categories"].clear()
     return category
 
 # Subcategory endpoints
 @api_router.get("/subcategories", response_model=List[SubCategory])
-async def get_subcategories(category_id: Optional[str] = None):
-    query = {"category_id": category_id} if category_id else {}
-    subcategories = await db.subcategories.find(query).to_list(1000)
-    return [SubCategory(**subcategory) for subcategory in subcategories]
+async def get_subcategories(request: Request, category_id: Optional[str] = None):
+    async def load():
+        query = {"category_id": category_id} if category_id else {}
+        subcategories = await db.subcategories.find(query, projection(SubCategory)).to_list(1000)
+        return [to_schema(subcategory, SubCategory) for subcategory in subcategories]
+    return await cached_json_response(request, "subcategories", category_id, load)
 
 @api_router.post("/subcategories", response_model=SubCategory)
 async def create_subcategory(subcategory: SubCategory, current_user: dict = Depends(get_current_user)):
@@ -300,14 +620,17 @@ async def create_subcategory(subcategory: SubCategory, current_user: dict = Depe
         raise HTTPException(status_code=403, detail="Admin access required")
     
     await db.subcategories.insert_one(subcategory.dict())
+    taxonomy_caches["subcategories"].clear()
     return subcategory
 
 # Size endpoints
 @api_router.get("/sizes", response_model=List[Size])
-async def get_sizes(category_id: Optional[str] = None):
-    query = {"category_id": category_id} if category_id else {}
-    sizes = await db.sizes.find(query).to_list(1000)
-    return [Size(**size) for size in sizes]
+async def get_sizes(request: Request, category_id: Optional[str] = None):
+    async def load():
+        query = {"category_id": category_id} if category_id else {}
+        sizes = await db.sizes.find(query, projection(Size)).to_list(1000)
+        return [to_schema(size, Size) for size in sizes]
+    return await cached_json_response(request, "sizes", category_id, load)
 
 @api_router.post("/sizes", response_model=Size)
 async def create_size(size: Size, current_user: dict = Depends(get_current_user)):
@@ -315,33 +638,106 @@ async def create_size(size: Size, current_user: dict = Depends(get_current_user)
         raise HTTPException(status_code=403, detail="Admin access required")
     
     await db.sizes.insert_one(size.dict())
+    taxonomy_caches["sizes"].clear()
     return size
 
 # Product endpoints
-@api_router.get("/products", response_model=List[Product])
-async def get_products(category_id: Optional[str] = None, subcategory_id: Optional[str] = None, 
-                      search: Optional[str] = None, skip: int = 0, limit: Optional[int] = None):
+PRODUCT_PAGE_SIZE = 24
+MAX_PRODUCT_PAGE_SIZE = 100
+
+async def get_products_page(category_id: Optional[str], subcategory_id: Optional[str],
+                            search: Optional[str], cursor: Optional[str], page_size: int) -> dict:
+    """Keyset pagination ordered by (created_at, id); search results page by rank offset."""
+    position = decode_cursor(cursor) if cursor else {}
+    
+    if search:
+        offset = position.get("o", 0)
+        if not isinstance(offset, int) or offset < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        await ensure_search_index()
+        ranked_ids = product_search.search(search, category_id, subcategory_id)
+        page_ids = ranked_ids[offset:offset + page_size]
+        products = await get_products_by_ids(page_ids, projection(Product))
+        next_offset = offset + page_size
+        return {
+            "items": [to_schema(products[pid], Product) for pid in page_ids if pid in products],
+            "next_cursor": encode_cursor({"o": next_offset}) if next_offset < len(ranked_ids) else None
+        }
+    
     query = {}
     if category_id:
         query["category_id"] = category_id
     if subcategory_id:
         query["subcategory_id"] = subcategory_id
-    if search:
+    if position:
+        try:
+            after_created_at = datetime.fromisoformat(position["c"])
+            after_id = str(position["i"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
         query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
+            {"created_at": {"$gt": after_created_at}},
+            {"created_at": after_created_at, "id": {"$gt": after_id}}
         ]
+    
+    products = await db.products.find(query, projection(Product)).sort([("created_at", 1), ("id", 1)]).limit(page_size + 1).to_list(page_size + 1)
+    next_cursor = None
+    if len(products) > page_size:
+        products = products[:page_size]
+        last = products[-1]
+        next_cursor = encode_cursor({"c": last["created_at"].isoformat(), "i": last["id"]})
+    return {"items": [to_schema(product, Product) for product in products], "next_cursor": next_cursor}
+
+@api_router.get("/products", response_model=Union[List[Product], ProductPage])
+async def get_products(request: Request,
+                      category_id: Optional[str] = None, subcategory_id: Optional[str] = None, 
+                      search: Optional[str] = None, skip: int = 0, limit: Optional[int] = None,
+                      cursor: Optional[str] = None,
+                      page_size: Optional[int] = Query(None, ge=1, le=MAX_PRODUCT_PAGE_SIZE)):
+    headers = {"ETag": await catalog_etag(request), "Cache-Control": CACHE_CONTROL["products"]}
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers)
+    
+    # Passing cursor (empty for the first page) or page_size opts into {items, next_cursor};
+    # skip/limit keep returning a bare list until clients have moved over.
+    if cursor is not None or page_size is not None:
+        page = await get_products_page(category_id, subcategory_id, search, cursor, page_size or PRODUCT_PAGE_SIZE)
+        return Response(content=dumps(page), media_type="application/json", headers=headers)
+    
+    if search:
+        # Ranked ids come from the search index; only the requested page is loaded
+        await ensure_search_index()
+        ranked_ids = product_search.search(search, category_id, subcategory_id)
+        page_ids = ranked_ids[skip:skip + (limit if limit is not None else 10000)]
+        products = await get_products_by_ids(page_ids, projection(Product))
+        items = [to_schema(products[pid], Product) for pid in page_ids if pid in products]
+        return Response(content=dumps(items), media_type="application/json", headers=headers)
+    
+    query = {}
+    if category_id:
+        query["category_id"] = category_id
+    if subcategory_id:
+        query["subcategory_id"] = subcategory_id
     if limit is not None:
-        products = await db.products.find(query).skip(skip).limit(limit).to_list(limit)
+        products = await db.products.find(query, projection(Product)).skip(skip).limit(limit).to_list(limit)
     else:
-        products = await db.products.find(query).skip(skip).to_list(10000)
-    return [Product(**product) for product in products]
+        products = await db.products.find(query, projection(Product)).skip(skip).to_list(10000)
+    items = [to_schema(product, Product) for product in products]
+    return Response(content=dumps(items), media_type="application/json", headers=headers)
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request, response: Response):
+    if request.headers.get("if-none-match"):
+        # Revalidation only needs the write timestamps, not the document
+        stamps = await db.products.find_one({"id": product_id}, {"_id": 0, "id": 1, "created_at": 1, "updated_at": 1})
+        if stamps and etag_matches(request, product_etag(stamps)):
+            return not_modified({"ETag": product_etag(stamps), "Cache-Control": CACHE_CONTROL["product"]})
+    
     product = await db.products.find_one({"id": product_id})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    response.headers["ETag"] = product_etag(product)
+    response.headers["Cache-Control"] = CACHE_CONTROL["product"]
     return Product(**product)
 
 @api_router.post("/products", response_model=Product)
@@ -350,9 +746,154 @@ async def create_product(product: ProductCreate, current_user: dict = Depends(ge
         raise HTTPException(status_code=403, detail="Admin access required")
     
     product_obj = Product(**product.dict())
+    product_obj.updated_at = product_obj.created_at
+    await attach_image_variants(product_obj)
     await db.products.insert_one(product_obj.dict())
+    await add_image_references(image_references([product_obj]))
+    await touch_catalog()
+    await increment_stats(db, total_products=1)
+    product_search.add(product_obj.dict())
     return product_obj
 
+PRODUCT_IMPORT_BATCH_SIZE = 1000
+PRODUCT_IMPORT_MAX_ERRORS = 1000
+# CSV cells for list fields hold values separated by "|"
+PRODUCT_IMPORT_LIST_FIELDS = ("sizes", "images")
+
+def iter_import_rows(stream, import_format: str):
+    """Yield (line number, row dict) from a CSV or NDJSON upload, one row at a time.
+
+    A row that cannot be parsed is yielded as an error message instead of a dict.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    line = 0
+    try:
+        if import_format == "csv":
+            reader = csv.DictReader(text)
+            for row in reader:
+                line = reader.line_num
+                if None in row:
+                    yield line, "Too many columns"
+                    continue
+                row = {key: value for key, value in row.items() if value not in (None, "")}
+                for field in PRODUCT_IMPORT_LIST_FIELDS:
+                    if field in row:
+                        row[field] = [value.strip() for value in row[field].split("|") if value.strip()]
+                yield line, row
+        else:
+            for line, raw in enumerate(text, start=1):
+                if not raw.strip():
+                    continue
+                try:
+                    row = json.loads(raw)
+                except ValueError:
+                    yield line, "Invalid JSON"
+                    continue
+                yield line, row if isinstance(row, dict) else "Expected a JSON object"
+    except (UnicodeDecodeError, csv.Error) as e:
+        yield line + 1, f"Unreadable file, import stopped: {e}"
+    finally:
+        # Leave the upload's file open; UploadFile closes it
+        text.detach()
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors())
+
+def add_import_error(report: dict, line: int, message: str) -> None:
+    report["failed"] += 1
+    if len(report["errors"]) < PRODUCT_IMPORT_MAX_ERRORS:
+        report["errors"].append({"line": line, "error": message})
+
+def read_import_batch(rows, size: int) -> Tuple[List[Tuple[int, "Product"]], List[Tuple[int, str]], bool]:
+    """Parse and validate rows until size of them are read; runs on the import executor.
+
+    Returns (line, product) for valid rows, (line, message) for invalid ones,
+    and whether the file is exhausted.
+    """
+    batch, errors = [], []
+    for line, row in rows:
+        if isinstance(row, str):
+            errors.append((line, row))
+        else:
+            try:
+                product = Product(**ProductCreate(**row).dict())
+                product.updated_at = product.created_at
+                batch.append((line, product))
+            except ValidationError as e:
+                errors.append((line, validation_message(e)))
+        if len(batch) + len(errors) >= size:
+            return batch, errors, False
+    return batch, errors, True
+
+def dump_products(products: List["Product"]) -> List[dict]:
+    return [product.dict() for product in products]
+
+async def insert_import_batch(batch: List[Tuple[int, "Product"]], report: dict) -> None:
+    """Insert one batch of validated products with a single unordered insert_many."""
+    products = [product for _, product in batch]
+    recorded = await recorded_variants(list({url for product in products for url in product.images}))
+    if recorded:
+        for product in products:
+            product.image_variants = [
+                ImageVariants(url=url, variants=recorded[url]) for url in dict.fromkeys(product.images) if url in recorded
+            ]
+    
+    documents = await import_executor.run(dump_products, products)
+    failed = set()
+    try:
+        await db.products.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            failed.add(error["index"])
+            add_import_error(report, batch[error["index"]][0], error.get("errmsg", "Write failed"))
+    report["inserted"] += len(documents) - len(failed)
+    product_search.add_many(document for index, document in enumerate(documents) if index not in failed)
+    inserted = [product for index, product in enumerate(products) if index not in failed]
+    await add_image_references(image_references(inserted))
+
+@api_router.post("/products/import")
+async def import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None, pattern="^(csv|ndjson)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Create products from a CSV or NDJSON file of ProductCreate rows.
+
+    Rows are read and validated a batch at a time on the import executor,
+    keeping the event loop free for other requests, and written in unordered
+    batches, so memory stays bounded by the batch size rather than the file
+    size. Invalid rows are skipped and listed in the report; valid rows are
+    still imported.
+    """
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    import_format = format
+    if import_format is None:
+        filename = (file.filename or "").lower()
+        if filename.endswith(".csv") or file.content_type == "text/csv":
+            import_format = "csv"
+        elif filename.endswith((".ndjson", ".jsonl")) or file.content_type == "application/x-ndjson":
+            import_format = "ndjson"
+        else:
+            raise HTTPException(status_code=400, detail="Unknown file format, pass format=csv or format=ndjson")
+    
+    report = {"inserted": 0, "failed": 0, "errors": []}
+    rows = iter_import_rows(file.file, import_format)
+    done = False
+    while not done:
+        batch, errors, done = await import_executor.run(read_import_batch, rows, PRODUCT_IMPORT_BATCH_SIZE)
+        for line, message in errors:
+            add_import_error(report, line, message)
+        if batch:
+            await insert_import_batch(batch, report)
+    
+    if report["inserted"]:
+        await touch_catalog()
+        await increment_stats(db, total_products=report["inserted"])
+    print(f"[IMPORT] {report['inserted']} products imported, {report['failed']} rows failed")
+    return report
+
 @api_router.put("/products/{product_id}", response_model=Product)
 async def update_product(product_id: str, product: ProductCreate, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
@@ -362,8 +903,15 @@ async def update_product(product_id: str, product: ProductCreate, current_user:
     if not existing_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    updated_product = Product(**{**existing_product, **product.dict()})
+    updated_product = Product(**{**existing_product, **product.dict(), "updated_at": datetime.utcnow()})
+    await attach_image_variants(updated_product)
     await db.products.replace_one({"id": product_id}, updated_product.dict())
+    await add_image_references(image_references([updated_product]))
+    await release_product_images(
+        product_id, [url for url in existing_product.get("images", []) if url not in updated_product.images]
+    )
+    await touch_catalog()
+    product_search.add(updated_product.dict())
     return updated_product
 
 @api_router.delete("/products/{product_id}")
@@ -372,27 +920,20 @@ async def delete_product(product_id: str, current_user: dict = Depends(get_curre
         raise HTTPException(status_code=403, detail="Admin access required")
     
     # Retrieve product to get image URLs
-    product = await db.products.find_one({"id": product_id})
+    product = await db.products.find_one({"id": product_id}, RELEASE_PRODUCT_FIELDS)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    # Delete images from S3 if they are S3 URLs
-    for image_url in product.get("images", []):
-        try:
-            bucket = os.environ['AWS_BUCKET_NAME']
-            region = os.environ['AWS_REGION']
-            s3_prefix = f"https://{bucket}.s3.{region}.amazonaws.com/"
-            if image_url.startswith(s3_prefix):
-                key = image_url[len(s3_prefix):]
-                s3_client.delete_object(Bucket=bucket, Key=key)
-                print(f"[S3 DELETE SUCCESS] {key}")
-        except Exception as e:
-            print(f"[S3 DELETE ERROR] {e}")
+    # Delete images from S3 that no other product or hero image uses
+    await release_product_images(product_id, product.get("images", []))
     
     # Delete product from DB
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    await increment_stats(db, total_products=-1)
+    await touch_catalog()
+    product_search.remove(product_id)
     return {"message": "Product deleted successfully"}
 
 # Image upload endpoints
@@ -406,22 +947,8 @@ async def upload_image(file: UploadFile = File(...), folder: str = Form("product
         raise HTTPException(status_code=400, detail="File must be an image")
     
     content = await file.read()
-    
-    # Process image to maintain quality
-    try:
-        image = Image.open(io.BytesIO(content))
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Save with high quality
-        output = io.BytesIO()
-        image.save(output, format='JPEG', quality=95, optimize=True)
-        content = output.getvalue()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
-    
-    image_url = upload_to_s3(content, file.filename, folder)
-    return {"image_url": image_url}
+    image_url, variants = await upload_image_variants(content, folder)
+    return {"image_url": image_url, "variants": variants}
 
 @api_router.post("/products/{product_id}/add-image")
 async def add_product_image(product_id: str, file: UploadFile = File(...), 
@@ -437,23 +964,28 @@ async def add_product_image(product_id: str, file: UploadFile = File(...),
         raise HTTPException(status_code=400, detail="File must be an image")
     
     content = await file.read()
-    image_url = upload_to_s3(content, file.filename, "products")
+    image_url, variants = await upload_image_variants(content, "products")
     
     # Add image to product
     product["images"].append(image_url)
+    if variants:
+        product.setdefault("image_variants", []).append({"url": image_url, "variants": variants})
+    product["updated_at"] = datetime.utcnow()
     await db.products.replace_one({"id": product_id}, product)
+    if variants:
+        await add_image_references({image_url: [product_id]})
+    await touch_catalog()
     
-    return {"image_url": image_url, "message": "Image added to product"}
+    return {"image_url": image_url, "variants": variants, "message": "Image added to product"}
 
 # Cart endpoints
 @api_router.get("/cart")
 async def get_cart(current_user: dict = Depends(get_current_user)):
-    cart_items = await db.cart_items.find({"user_id": current_user["id"]}).to_list(1000)
+    cart_items = await db.cart_items.find({"user_id": current_user["id"]}, {"_id": 0}).to_list(1000)
+    products = await get_products_by_ids([item["product_id"] for item in cart_items], CART_PRODUCT_FIELDS)
     result = []
     for item in cart_items:
-        # Remove MongoDB _id field if present
-        item.pop("_id", None)
-        product = await db.products.find_one({"id": item["product_id"]})
+        product = products.get(item["product_id"])
         if product:
             item["product_title"] = product.get("title")
             item["product_price"] = product.get("price")
@@ -462,56 +994,92 @@ async def get_cart(current_user: dict = Depends(get_current_user)):
         result.append(item)
     return result
 
+def cart_upsert(item: CartItem) -> Tuple[dict, dict]:
+    """Filter and update that add item's quantity to its cart line, creating the line if missing."""
+    key = {"user_id": item.user_id, "product_id": item.product_id, "size": item.size}
+    on_insert = {field: value for field, value in item.dict().items() if field not in key and field != "quantity"}
+    return key, {"$inc": {"quantity": item.quantity}, "$setOnInsert": on_insert}
+
+async def add_cart_item(item: CartItem) -> CartItem:
+    """Atomically add item to the cart in one round trip, merging with an existing line."""
+    key, update = cart_upsert(item)
+    try:
+        line = await db.cart_items.find_one_and_update(
+            key, update, projection={"_id": 0}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent add created the line between our match and insert; it matches now
+        line = await db.cart_items.find_one_and_update(
+            key, update, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+    return CartItem(**line)
+
+async def merge_duplicate_cart_items():
+    """Fold duplicate (user, product, size) cart lines into one so the unique index can build."""
+    duplicates = db.cart_items.aggregate([
+        {"$group": {
+            "_id": {"user_id": "$user_id", "product_id": "$product_id", "size": "$size"},
+            "ids": {"$push": "$id"},
+            "quantity": {"$sum": "$quantity"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ])
+    merged = 0
+    async for group in duplicates:
+        keep, *extra = group["ids"]
+        await db.cart_items.update_one({"id": keep}, {"$set": {"quantity": group["quantity"]}})
+        await db.cart_items.delete_many({"id": {"$in": extra}})
+        merged += len(extra)
+    if merged:
+        print(f"[CART] merged {merged} duplicate cart lines")
+
 @api_router.post("/cart", response_model=CartItem, status_code=201)
 async def add_to_cart(item: CartItem, current_user: dict = Depends(get_current_user)):
     item.user_id = current_user["id"]
+    return await add_cart_item(item)
+
+@api_router.post("/cart/batch", response_model=List[CartItem], status_code=201)
+async def add_to_cart_batch(batch: CartBatch, current_user: dict = Depends(get_current_user)):
+    """Add many lines in one request; lines for the same product and size are summed."""
+    items: Dict[Tuple[str, Optional[str]], CartItem] = {}
+    for line in batch.items:
+        key = (line.product_id, line.size)
+        if key in items:
+            items[key].quantity += line.quantity
+        else:
+            items[key] = CartItem(user_id=current_user["id"], **line.dict())
     
-    # Check if item already exists
-    existing_item = await db.cart_items.find_one({
-        "user_id": current_user["id"],
-        "product_id": item.product_id,
-        "size": item.size
-    })
-    
-    if existing_item:
-        # Update quantity
-        existing_item["quantity"] += item.quantity
-        await db.cart_items.replace_one({"id": existing_item["id"]}, existing_item)
-        return CartItem(**existing_item)
-    else:
-        await db.cart_items.insert_one(item.dict())
-        return item
+    operations = [UpdateOne(*cart_upsert(item), upsert=True) for item in items.values()]
+    try:
+        await db.cart_items.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Upserts that lost a race with a concurrent add; retried, they match the new line
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        await db.cart_items.bulk_write([operations[error["index"]] for error in errors], ordered=False)
+    
+    lines = await db.cart_items.find(
+        {"user_id": current_user["id"], "$or": [{"product_id": product_id, "size": size} for product_id, size in items]},
+        {"_id": 0}
+    ).to_list(len(items))
+    return [CartItem(**line) for line in lines]
 
 @api_router.post("/cart/items", response_model=CartItem, status_code=201)
 async def add_to_cart_items(
     product_id: str = Form(...),
-    quantity: int = Form(1),
+    quantity: int = Form(1, ge=1),
     size: Optional[str] = Form(None),
     current_user: dict = Depends(get_current_user)
 ):
-    # Create cart item
     item = CartItem(
         user_id=current_user["id"],
         product_id=product_id,
         quantity=quantity,
         size=size
     )
-    
-    # Check if item already exists
-    existing_item = await db.cart_items.find_one({
-        "user_id": current_user["id"],
-        "product_id": product_id,
-        "size": size
-    })
-    
-    if existing_item:
-        # Update quantity
-        existing_item["quantity"] += quantity
-        await db.cart_items.replace_one({"id": existing_item["id"]}, existing_item)
-        return CartItem(**existing_item)
-    else:
-        await db.cart_items.insert_one(item.dict())
-        return item
+    return await add_cart_item(item)
 
 @api_router.delete("/cart/{item_id}")
 async def remove_from_cart(item_id: str, current_user: dict = Depends(get_current_user)):
@@ -545,25 +1113,157 @@ async def update_cart_item(
 # Order endpoints
 @api_router.get("/orders", response_model=List[Order])
 async def get_orders(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] == "admin":
-        orders = await db.orders.find().to_list(1000)
-    else:
-        orders = await db.orders.find({"user_id": current_user["id"]}).to_list(1000)
-    return [Order(**order) for order in orders]
+    query = {} if current_user["role"] == "admin" else {"user_id": current_user["id"]}
+    orders = await db.orders.find(query, projection(Order)).to_list(1000)
+    return Response(content=dumps([to_schema(order, Order) for order in orders]), media_type="application/json")
+
+ORDER_STATUSES = ["preparing", "dispatched", "completed"]
+ORDER_EXPORT_FIELDS = ["id", "user_id", "created_at", "status", "total_amount", "billing_address", "phone", "items"]
+ORDER_EXPORT_BATCH_SIZE = 500
+
+async def stream_orders(cursor, export_format: str):
+    """Yield orders from a Motor cursor as NDJSON or CSV, one batch of rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=ORDER_EXPORT_FIELDS, extrasaction="ignore")
+    if export_format == "csv":
+        writer.writeheader()
+    rows = 0
+    async for order in cursor:
+        order["created_at"] = order["created_at"].isoformat()
+        if export_format == "csv":
+            writer.writerow({**order, "items": json.dumps(order.get("items", []), default=str)})
+        else:
+            buffer.write(json.dumps(order, default=str))
+            buffer.write("\n")
+        rows += 1
+        if rows % ORDER_EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@api_router.get("/orders/export")
+async def export_orders(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if status is not None and status not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid status")
+    
+    query = {}
+    if start or end:
+        query["created_at"] = {}
+        if start:
+            query["created_at"]["$gte"] = start
+        if end:
+            query["created_at"]["$lt"] = end
+    if status:
+        query["status"] = status
+    
+    cursor = db.orders.find(query, {"_id": 0}).sort("created_at", 1).batch_size(ORDER_EXPORT_BATCH_SIZE)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"orders-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format}"
+    return StreamingResponse(
+        stream_orders(cursor, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+async def release_stock(reservation_id: str, quantities: Dict[str, int]) -> None:
+    """Return the units reservation_id took to stock and invalidate ETags issued meanwhile.
+
+    Only products carrying the reservation's tag are touched, so lines whose
+    decrement never matched are not incremented.
+    """
+    if not quantities:
+        return
+    now = datetime.utcnow()
+    try:
+        await db.products.bulk_write([
+            UpdateOne(
+                {"id": product_id, "reservations": reservation_id},
+                {"$inc": {"quantity": quantity}, "$pull": {"reservations": reservation_id}, "$set": {"updated_at": now}}
+            )
+            for product_id, quantity in quantities.items()
+        ], ordered=False)
+    except Exception as e:
+        print(f"[STOCK RELEASE ERROR] {reservation_id} {quantities}: {e}")
+        raise
+    finally:
+        await touch_catalog()
+
+async def reserve_stock(reservation_id: str, quantities: Dict[str, int], products: Dict[str, dict]) -> None:
+    """Decrement stock for every product in one bulk_write, all or nothing.
+
+    Each decrement only matches while quantity >= the requested amount, and
+    tags the product with reservation_id. If any line does not match (short
+    stock, or the product was deleted after pricing), the tagged lines are
+    released again and the checkout is rejected with 409. Call
+    finish_reservation once the order is stored.
+    """
+    if not quantities:
+        return
+    if any(quantity <= 0 for quantity in quantities.values()):
+        raise ValueError(f"Stock reservations must be positive: {quantities}")
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"id": product_id, "quantity": {"$gte": quantity}},
+            {"$inc": {"quantity": -quantity}, "$push": {"reservations": reservation_id}, "$set": {"updated_at": now}}
+        )
+        for product_id, quantity in quantities.items()
+    ]
+    try:
+        result = await db.products.bulk_write(operations, ordered=False)
+    except BulkWriteError:
+        # Write errors or a write-concern failure: some lines may have applied
+        await release_stock(reservation_id, quantities)
+        raise
+    if result.matched_count == len(operations):
+        return
+    
+    reserved = set(await db.products.distinct("id", {"id": {"$in": list(quantities)}, "reservations": reservation_id}))
+    await release_stock(reservation_id, quantities)
+    missing = [product_id for product_id in quantities if product_id not in reserved]
+    remaining = set(await db.products.distinct("id", {"id": {"$in": missing}}))
+    short = [product_id for product_id in missing if product_id in remaining]
+    if short:
+        raise HTTPException(status_code=409, detail=f"Insufficient stock for {products[short[0]]['title']}")
+    raise HTTPException(status_code=409, detail="A product in your cart is no longer available")
+
+async def finish_reservation(reservation_id: str, quantities: Dict[str, int]) -> None:
+    """Drop the reservation's tags once its order is stored."""
+    await db.products.update_many(
+        {"id": {"$in": list(quantities)}, "reservations": reservation_id}, {"$pull": {"reservations": reservation_id}}
+    )
 
 @api_router.post("/orders", response_model=Order)
-async def create_order(order_data: OrderCreate, current_user: dict = Depends(get_current_user)):
+async def create_order(order_data: OrderCreate, request: Request, current_user: dict = Depends(get_current_user)):
+    return await idempotent_response(request, "create_order", current_user["id"], order_data,
+                                     lambda: place_order(order_data, current_user))
+
+async def place_order(order_data: OrderCreate, current_user: dict) -> Order:
     # Get cart items
-    cart_items = await db.cart_items.find({"user_id": current_user["id"]}).to_list(1000)
+    cart_items = await db.cart_items.find({"user_id": current_user["id"]}, {"_id": 0}).to_list(1000)
     if not cart_items:
         raise HTTPException(status_code=400, detail="Cart is empty")
+    if any(item["quantity"] <= 0 for item in cart_items):
+        raise HTTPException(status_code=400, detail="Cart contains an invalid quantity")
     
     # Calculate total and prepare order items
+    products = await get_products_by_ids([item["product_id"] for item in cart_items], ORDER_PRODUCT_FIELDS)
     total_amount = 0
     order_items = []
     
     for cart_item in cart_items:
-        product = await db.products.find_one({"id": cart_item["product_id"]})
+        product = products.get(cart_item["product_id"])
         if product:
             item_total = product["price"] * cart_item["quantity"]
             total_amount += item_total
@@ -586,7 +1286,19 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
         phone=order_data.phone
     )
     
-    await db.orders.insert_one(order.dict())
+    # Reserve stock for all lines before the order exists; a failed line leaves stock untouched
+    quantities: Dict[str, int] = {}
+    for item in order_items:
+        quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+    await reserve_stock(order.id, quantities, products)
+    try:
+        await db.orders.insert_one(order.dict())
+    except Exception:
+        await release_stock(order.id, quantities)
+        raise
+    await finish_reservation(order.id, quantities)
+    await touch_catalog()
+    await increment_stats(db, total_orders=1, total_revenue=total_amount)
     
     # Clear cart
     await db.cart_items.delete_many({"user_id": current_user["id"]})
@@ -598,7 +1310,7 @@ async def update_order_status(order_id: str, status: str, current_user: dict = D
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    if status not in ["preparing", "dispatched", "completed"]:
+    if status not in ORDER_STATUSES:
         raise HTTPException(status_code=400, detail="Invalid status")
     
     result = await db.orders.update_one({"id": order_id}, {"$set": {"status": status}})
@@ -609,9 +1321,11 @@ async def update_order_status(order_id: str, status: str, current_user: dict = D
 
 # Hero image endpoints
 @api_router.get("/hero-images", response_model=List[HeroImage])
-async def get_hero_images():
-    images = await db.hero_images.find({"is_active": True}).to_list(10)
-    return [HeroImage(**image) for image in images]
+async def get_hero_images(request: Request):
+    async def load():
+        images = await db.hero_images.find({"is_active": True}, projection(HeroImage)).to_list(10)
+        return [to_schema(image, HeroImage) for image in images]
+    return await cached_json_response(request, "hero_images", None, load)
 
 @api_router.post("/hero-images", response_model=HeroImage)
 async def create_hero_image(hero_image: HeroImage, current_user: dict = Depends(get_current_user)):
@@ -619,6 +1333,7 @@ async def create_hero_image(hero_image: HeroImage, current_user: dict = Depends(
         raise HTTPException(status_code=403, detail="Admin access required")
     
     await db.hero_images.insert_one(hero_image.dict())
+    taxonomy_caches["hero_images"].clear()
     return hero_image
 
 # Dashboard stats
@@ -627,21 +1342,53 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    total_orders = await db.orders.count_documents({})
-    total_users = await db.users.count_documents({"role": "customer"})
-    total_products = await db.products.count_documents({})
+    return await read_stats(db)
+
+@api_router.post("/dashboard/stats/rebuild")
+async def rebuild_dashboard_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
     
-    # Calculate total revenue
-    orders = await db.orders.find().to_list(1000)
-    total_revenue = sum(order["total_amount"] for order in orders)
+    await rebuild_stats(db)
+    return await read_stats(db)
+
+@api_router.get("/admin/cache-stats")
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
     
     return {
-        "total_orders": total_orders,
-        "total_users": total_users,
-        "total_products": total_products,
-        "total_revenue": total_revenue
+        "principal": principal_cache.stats(),
+        **{name: cache.stats() for name, cache in taxonomy_caches.items()}
     }
 
+@api_router.get("/admin/executor-stats")
+async def get_executor_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return executor_stats()
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=500),
+    sort: str = Query("total_ms", pattern="^(total_ms|max_ms|count)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Slow Mongo operations grouped by query shape, worst first, plus the most recent ones."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return slow_queries.report(limit, sort)
+
+@api_router.delete("/admin/slow-queries")
+async def clear_slow_queries(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    slow_queries.clear()
+    return {"message": "Slow query log cleared"}
+
 # Initialize demo data
 @api_router.post("/initialize-demo-data")
 async def initialize_demo_data():
@@ -654,7 +1401,7 @@ async def initialize_demo_data():
             "name": "Admin User",
             "role": "admin",
             "created_at": datetime.utcnow(),
-            "hashed_password": hash_password("DesignStudio@22")
+            "hashed_password": await hash_password("DesignStudio@22")
         }
         await db.users.insert_one(admin_user)
     
@@ -737,6 +1484,9 @@ async def initialize_demo_data():
             if not existing:
                 product = Product(**prod_data)
                 await db.products.insert_one(product.dict())
+                await increment_stats(db, total_products=1)
+                await touch_catalog()
+                product_search.add(product.dict())
     
     # Create hero images
     hero_images_data = [
@@ -760,26 +1510,34 @@ async def initialize_demo_data():
             hero_image = HeroImage(**hero_data)
             await db.hero_images.insert_one(hero_image.dict())
     
+    for cache in taxonomy_caches.values():
+        cache.clear()
     return {"message": "Demo data initialized successfully"}
 
 # Razorpay order creation endpoint
 @api_router.post("/create-razorpay-order")
-async def create_razorpay_order(data: dict, current_user: dict = Depends(get_current_user)):
-    import razorpay
+async def create_razorpay_order(data: dict, request: Request, current_user: dict = Depends(get_current_user)):
+    return await idempotent_response(request, "create_razorpay_order", current_user["id"], data,
+                                     lambda: request_razorpay_order(data))
+
+async def request_razorpay_order(data: dict) -> dict:
     amount = data.get("amount")
     if not amount or amount < 100:
         raise HTTPException(status_code=400, detail="Invalid amount")
     try:
-        razorpay_client = razorpay.Client(auth=(os.environ["RAZORPAY_KEY_ID"], os.environ["RAZORPAY_KEY_SECRET"]))
-        order = razorpay_client.order.create({
-            "amount": int(amount),
-            "currency": "INR",
-            "payment_capture": 1
-        })
+        order = await payments.create_order(int(amount))
         return {
             "order_id": order["id"],
-            "razorpay_key": os.environ["RAZORPAY_KEY_ID"]
+            "razorpay_key": payments.key_id
         }
+    except ExecutorBusy:
+        raise
+    except requests.Timeout as e:
+        print("[RAZORPAY TIMEOUT]", e)
+        raise HTTPException(status_code=504, detail="Payment gateway timed out, please retry")
+    except razorpay.errors.BadRequestError as e:
+        print("[RAZORPAY ERROR]", e)
+        raise HTTPException(status_code=400, detail=f"Failed to create Razorpay order: {str(e)}")
     except Exception as e:
         print("[RAZORPAY ERROR]", e)
         raise HTTPException(status_code=500, detail=f"Failed to create Razorpay order: {str(e)}")
@@ -794,6 +1552,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_db_indexes():
+    # The cart line index became unique; existing duplicates must be merged before it can build
+    if "user_product_size_unique" not in await db.cart_items.index_information():
+        await merge_duplicate_cart_items()
+    await ensure_indexes(db)
+    await ensure_search_index()
+
+@app.on_event("startup")
+async def start_slow_query_explain():
+    slow_queries.bind(client)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+    payments.close()
+    shutdown_executors()
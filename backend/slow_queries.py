@@ -0,0 +1,237 @@
+"""Slow MongoDB operation log.
+
+SlowQueryLog is a pymongo command listener. Every command slower than the
+threshold is recorded with:
+
+- its shape: the filter, sort and pipeline with every value replaced by
+  "?", so one query with different parameters is a single entry
+- the route that issued it, taken from the request context
+
+Entries are aggregated per shape in memory (count, total and max time,
+routes) for the admin endpoint, and each slow operation is appended as a
+JSON line to a rotating log file.
+
+With SLOW_QUERY_EXPLAIN enabled, the first slow occurrence of each shape is
+explained (queryPlanner verbosity, which plans but does not execute the
+query) in the background, so a collection scan shows up as a COLLSCAN stage.
+
+Settings (environment):
+    SLOW_QUERY_THRESHOLD_MS  operations at or above this are logged (default 100)
+    SLOW_QUERY_EXPLAIN       "1" to capture explain output (default off)
+    SLOW_QUERY_LOG_PATH      rotating log file, empty to disable (default logs/slow_queries.log)
+    SLOW_QUERY_LOG_MAX_BYTES size at which the log rotates (default 10 MB)
+    SLOW_QUERY_LOG_BACKUPS   rotated files kept (default 5)
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring
+
+from metrics import request_route
+
+logger = logging.getLogger(__name__)
+
+# Fields that describe which documents a command touches and in what order
+SHAPE_FIELDS = ("filter", "query", "pipeline", "sort", "key", "hint")
+# Write commands carry their filters inside a list of statements
+STATEMENT_FIELDS = ("updates", "deletes")
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Keys the driver adds to every command; explain supplies its own
+DRIVER_FIELDS = {"lsid", "txnNumber", "$db", "$clusterTime", "$readPreference", "readConcern", "writeConcern"}
+
+MAX_SHAPES = 500
+MAX_ROUTES_PER_SHAPE = 20
+RECENT_ENTRIES = 200
+
+_explaining = contextvars.ContextVar("slow_query_explaining", default=False)
+
+
+def normalize(value: Any) -> Any:
+    """Replace literal values with "?", keeping keys, operators and $field references."""
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [normalize(item) for item in value]
+        return ["?"]
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    return "?"
+
+
+def command_shape(command: dict) -> dict:
+    shape = {}
+    for field in SHAPE_FIELDS:
+        if field in command:
+            # Sort, projection keys and hints are structure, not parameters
+            shape[field] = command[field] if field in ("sort", "key", "hint") else normalize(command[field])
+    for field in STATEMENT_FIELDS:
+        if field in command:
+            filters = []
+            for statement in command[field]:
+                statement_shape = normalize(statement.get("q", {}))
+                if statement_shape not in filters:
+                    filters.append(statement_shape)
+            shape[field] = filters
+    return shape
+
+
+def plan_stages(explain: Any) -> List[str]:
+    """Flatten an explain document into its plan stages, e.g. ["FETCH", "IXSCAN email_unique"]."""
+    stages = []
+    if isinstance(explain, dict):
+        if isinstance(explain.get("stage"), str):
+            index = explain.get("indexName")
+            stages.append(f"{explain['stage']} {index}" if index else explain["stage"])
+        for key, item in explain.items():
+            if key != "rejectedPlans":
+                stages.extend(plan_stages(item))
+    elif isinstance(explain, list):
+        for item in explain:
+            stages.extend(plan_stages(item))
+    return stages
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = 100, explain: bool = False, log_path: Optional[str] = None,
+                 max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.shapes: Dict[str, dict] = {}
+        self.recent = deque(maxlen=RECENT_ENTRIES)
+        self._pending: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client = None
+        self._file_logger = None
+        if log_path:
+            Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._file_logger = logging.getLogger(f"{__name__}.file")
+            self._file_logger.addHandler(handler)
+            self._file_logger.setLevel(logging.INFO)
+            self._file_logger.propagate = False
+
+    @classmethod
+    def from_env(cls, root: Path) -> "SlowQueryLog":
+        log_path = os.environ.get('SLOW_QUERY_LOG_PATH', str(root / 'logs' / 'slow_queries.log'))
+        return cls(
+            threshold_ms=float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100)),
+            explain=os.environ.get('SLOW_QUERY_EXPLAIN', '').lower() in ('1', 'true', 'yes'),
+            log_path=log_path or None,
+            max_bytes=int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+            backups=int(os.environ.get('SLOW_QUERY_LOG_BACKUPS', 5)),
+        )
+
+    def bind(self, client) -> None:
+        """Allow explain capture; call from the event loop once the client is ready."""
+        self._loop = asyncio.get_running_loop()
+        self._client = client
+
+    # Listener callbacks run on Motor's worker threads, inside a copy of the
+    # calling task's context, so request_route still names the route.
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if _explaining.get():
+            return
+        self._pending[(event.connection_id, event.request_id)] = (event.command, request_route.get())
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, failure=str(event.failure))
+
+    def _finish(self, event, failure: Optional[str] = None) -> None:
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < self.threshold_ms:
+            return
+        command, route = pending
+        name = event.command_name
+        collection = command.get("collection") if name == "getMore" else command.get(name)
+        shape = command_shape(command)
+        shape_id = hashlib.sha1(
+            json.dumps([event.database_name, collection, name, shape], default=str).encode()
+        ).hexdigest()[:16]
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "shape_id": shape_id,
+            "database": event.database_name,
+            "collection": collection if isinstance(collection, str) else None,
+            "command": name,
+            "shape": shape,
+            "duration_ms": round(duration_ms, 2),
+            "route": route,
+        }
+        if failure:
+            entry["failure"] = failure
+
+        explain = False
+        with self._lock:
+            self.recent.append(entry)
+            record = self.shapes.get(shape_id)
+            if record is None and len(self.shapes) < MAX_SHAPES:
+                record = self.shapes[shape_id] = {
+                    **{key: entry[key] for key in ("shape_id", "database", "collection", "command", "shape")},
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "first_seen": entry["at"], "routes": {},
+                }
+                explain = self.explain and name in EXPLAINABLE and self._loop is not None
+            if record is not None:
+                record["count"] += 1
+                record["total_ms"] = round(record["total_ms"] + duration_ms, 2)
+                record["max_ms"] = max(record["max_ms"], entry["duration_ms"])
+                record["last_seen"] = entry["at"]
+                if route in record["routes"] or len(record["routes"]) < MAX_ROUTES_PER_SHAPE:
+                    record["routes"][route] = record["routes"].get(route, 0) + 1
+
+        if self._file_logger:
+            self._file_logger.info(json.dumps(entry, default=str))
+        if explain:
+            self._loop.call_soon_threadsafe(self._start_explain, shape_id, event.database_name, command)
+
+    def _start_explain(self, shape_id: str, database: str, command: dict) -> None:
+        asyncio.ensure_future(self._explain(shape_id, database, command))
+
+    async def _explain(self, shape_id: str, database: str, command: dict) -> None:
+        _explaining.set(True)  # this task's own commands are not logged
+        explainable = {key: value for key, value in command.items() if key not in DRIVER_FIELDS}
+        try:
+            result = await self._client[database].command({"explain": explainable, "verbosity": "queryPlanner"})
+        except Exception as e:
+            logger.warning("Explain failed for slow query %s: %s", shape_id, e)
+            return
+        stages = plan_stages(result)
+        with self._lock:
+            if shape_id in self.shapes:
+                self.shapes[shape_id]["explain"] = {
+                    "stages": stages,
+                    "collection_scan": any(stage.startswith("COLLSCAN") for stage in stages),
+                    "winning_plan": result.get("queryPlanner", {}).get("winningPlan"),
+                }
+
+    def report(self, limit: int = 50, sort: str = "total_ms") -> dict:
+        with self._lock:
+            shapes = sorted(self.shapes.values(), key=lambda record: record[sort], reverse=True)[:limit]
+            return {
+                "threshold_ms": self.threshold_ms,
+                "explain": self.explain,
+                "shapes": [dict(record, routes=dict(record["routes"])) for record in shapes],
+                "recent": list(self.recent)[-limit:],
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self.shapes.clear()
+            self.recent.clear()
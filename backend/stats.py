@@ -0,0 +1,70 @@
+"""Precomputed dashboard counters.
+
+The admin dashboard reads a single document from the ``stats`` collection.
+Write paths keep it current with ``$inc`` updates as orders, customers and
+products are created or deleted, so the dashboard never counts or sums whole
+collections on a page view.
+
+Increments only apply to an existing document. When it is missing (first
+boot, or after it was dropped), the next read rebuilds it from the source
+collections. ``python stats.py rebuild`` or ``POST /api/dashboard/stats/rebuild``
+reconcile the counters after out-of-band data changes.
+"""
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+DASHBOARD_STATS_ID = "dashboard"
+STATS_FIELDS = ["total_orders", "total_users", "total_products", "total_revenue"]
+
+
+async def increment_stats(db, **increments) -> None:
+    """Apply counter deltas, e.g. increment_stats(db, total_orders=1, total_revenue=599.0)."""
+    await db.stats.update_one({"_id": DASHBOARD_STATS_ID}, {"$inc": increments})
+
+
+async def rebuild_stats(db) -> dict:
+    """Recount every counter from the source collections and store the result."""
+    revenue = await db.orders.aggregate([
+        {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
+    ]).to_list(1)
+    stats = {
+        "total_orders": await db.orders.count_documents({}),
+        "total_users": await db.users.count_documents({"role": "customer"}),
+        "total_products": await db.products.count_documents({}),
+        "total_revenue": revenue[0]["total"] if revenue else 0,
+        "rebuilt_at": datetime.utcnow(),
+    }
+    await db.stats.replace_one({"_id": DASHBOARD_STATS_ID}, stats, upsert=True)
+    return stats
+
+
+async def read_stats(db) -> dict:
+    stats = await db.stats.find_one({"_id": DASHBOARD_STATS_ID})
+    if stats is None:
+        stats = await rebuild_stats(db)
+    return {field: stats.get(field, 0) for field in STATS_FIELDS}
+
+
+async def _main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        stats = await rebuild_stats(db)
+        print(json.dumps(stats, indent=2, default=str))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage precomputed dashboard stats")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    asyncio.run(_main())
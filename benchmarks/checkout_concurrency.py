@@ -0,0 +1,97 @@
+"""Fire many simultaneous checkouts at a product with limited stock.
+
+Every buyer has the same product in their cart, plus a second product with
+ample stock so that a rejected checkout must also roll back a line that was
+already reserved. All checkouts start at once; the run fails unless exactly
+``stock`` orders succeed, the rest are rejected with 409, and both products
+end with the expected quantity (no overselling, nothing lost to rollbacks).
+
+Usage: python benchmarks/checkout_concurrency.py [--buyers 300] [--stock 100] [--rtt-ms 2]
+"""
+import argparse
+import asyncio
+import time
+
+from harness import create_user, load_server, make_client, summarize
+
+SPARE_STOCK = 1_000_000
+
+
+async def checkout(client, user, samples: list) -> int:
+    started = time.perf_counter()
+    response = await client.post("/api/orders", headers=user["headers"],
+                                 json={"billing_address": "Bench", "phone": "0"})
+    samples.append((time.perf_counter() - started) * 1000)
+    return response.status_code
+
+
+async def run(buyers: int, stock: int, rtt_ms: float) -> dict:
+    """Check out every buyer at once; returns order counts, remaining stock and latency."""
+    server = load_server(rtt_ms)
+    # Build the production indexes; the harness skips startup
+    await server.ensure_indexes(server.db)
+
+    limited = server.Product(title="Limited Drop", description="Bench", category_id="bench",
+                             price=100.0, quantity=stock)
+    spare = server.Product(title="Sticker", description="Bench", category_id="bench",
+                           price=5.0, quantity=SPARE_STOCK)
+    await server.db.products.insert_many([limited.dict(), spare.dict()])
+
+    users = [await create_user(server) for _ in range(buyers)]
+    await server.db.cart_items.insert_many([
+        server.CartItem(user_id=user["id"], product_id=product.id, quantity=1, size="M").dict()
+        for user in users for product in (spare, limited)
+    ])
+
+    samples = []
+    async with make_client(server) as client:
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(checkout(client, user, samples) for user in users))
+        elapsed = time.perf_counter() - started
+
+    remaining = {
+        product["id"]: product["quantity"]
+        async for product in server.db.products.find({}, {"_id": 0, "id": 1, "quantity": 1})
+    }
+    return {
+        "succeeded": statuses.count(200),
+        "rejected": statuses.count(409),
+        "other": len(statuses) - statuses.count(200) - statuses.count(409),
+        "orders": await server.db.orders.count_documents({}),
+        "limited_remaining": remaining[limited.id],
+        "spare_remaining": remaining[spare.id],
+        "elapsed": elapsed,
+        "latency": summarize(samples),
+    }
+
+
+def adds_up(result: dict, buyers: int, stock: int) -> bool:
+    """True when exactly min(buyers, stock) orders went through and stock matches them."""
+    succeeded = result["succeeded"]
+    return (succeeded == min(buyers, stock)
+            and succeeded + result["rejected"] == buyers
+            and result["orders"] == succeeded
+            and result["limited_remaining"] == stock - succeeded
+            and result["spare_remaining"] == SPARE_STOCK - succeeded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buyers", type=int, default=300, help="simultaneous checkouts")
+    parser.add_argument("--stock", type=int, default=100, help="units of the limited product")
+    parser.add_argument("--rtt-ms", type=float, default=2.0, help="simulated Mongo round-trip time")
+    args = parser.parse_args()
+    result = asyncio.run(run(args.buyers, args.stock, args.rtt_ms))
+    stats = result["latency"]
+    print(f"buyers {args.buyers}, stock {args.stock}: {result['succeeded']} ordered, "
+          f"{result['rejected']} rejected, {result['other']} other")
+    print(f"throughput {args.buyers / result['elapsed']:.0f} checkouts/s, p50 {stats['p50_ms']:.1f} ms, "
+          f"p99 {stats['p99_ms']:.1f} ms")
+    print(f"remaining stock: limited {result['limited_remaining']}, spare {result['spare_remaining']}")
+    if not adds_up(result, args.buyers, args.stock):
+        raise SystemExit("FAIL: stock and orders do not add up")
+    print("OK: no overselling")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Local stand-in for the Razorpay Orders API.
+
+Answers POST /v1/orders the way Razorpay does, with an optional artificial
+latency, so the payment path can be exercised without network access or
+real credentials. Point the server at it with RAZORPAY_BASE_URL.
+
+An amount of REJECTED_AMOUNT paise gets Razorpay's BAD_REQUEST_ERROR
+response, so error handling can be checked too.
+
+Usage: python benchmarks/fake_razorpay.py [--port 9100] [--latency-ms 50]
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+REJECTED_AMOUNT = 99_999_999_999
+
+
+class FakeRazorpayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients can reuse connections
+    latency = 0.0
+    orders_created = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, code: str, description: str) -> None:
+        self._reply(status, {"error": {"code": code, "description": description}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.path != "/v1/orders":
+            self._error(404, "BAD_REQUEST_ERROR", "The requested URL was not found on the server.")
+            return
+        auth = self.headers.get("Authorization", "")
+        key_id = base64.b64decode(auth[6:]).decode().split(":")[0] if auth.startswith("Basic ") else ""
+        if not key_id:
+            self._error(401, "BAD_REQUEST_ERROR", "The api key provided is invalid")
+            return
+        data = json.loads(body or b"{}")
+        if data.get("amount") == REJECTED_AMOUNT:
+            self._error(400, "BAD_REQUEST_ERROR", "Amount exceeds maximum amount allowed.")
+            return
+
+        type(self).orders_created += 1
+        self._reply(200, {
+            "id": f"order_{uuid.uuid4().hex[:14]}",
+            "entity": "order",
+            "amount": data.get("amount"),
+            "amount_paid": 0,
+            "amount_due": data.get("amount"),
+            "currency": data.get("currency", "INR"),
+            "receipt": data.get("receipt"),
+            "status": "created",
+            "attempts": 0,
+            "notes": data.get("notes", []),
+            "created_at": int(time.time()),
+        })
+
+
+def start_fake_razorpay(port: int = 0, latency_ms: float = 0) -> Tuple[str, ThreadingHTTPServer]:
+    """Serve the fake API on a background thread; returns (base URL, server)."""
+    handler = type("Handler", (FakeRazorpayHandler,), {"latency": latency_ms / 1000.0})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay before each response")
+    args = parser.parse_args()
+    url, server = start_fake_razorpay(args.port, args.latency_ms)
+    print(f"Fake Razorpay listening on {url} (set RAZORPAY_BASE_URL={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""In-process harness for benchmarking the IllustraDesign API.
+
+Imports ``backend/server.py`` directly and swaps its Motor database for an
+in-memory mongomock-motor database, so benchmarks need no running mongod;
+a local mongod can be used instead by passing its URL.
+Every database command is delayed by a configurable round-trip time to
+model the network hop to Atlas; without it, an in-memory store would hide
+exactly the per-query costs these benchmarks are meant to expose.
+
+Requires: pip install mongomock-motor httpx
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from pymongo.errors import OperationFailure
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# server.py reads these at import time; keep the harness offline.
+_ENV_DEFAULTS = {
+    "MONGO_URL": "mongodb://localhost:27017",
+    "DB_NAME": "illustra_benchmark",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_BUCKET_NAME": "illustra-benchmark",
+    "AWS_REGION": "us-east-1",
+    "JWT_SECRET_KEY": "benchmark-secret",
+    "JWT_ALGORITHM": "HS256",
+    "RAZORPAY_KEY_ID": "rzp_test_benchmark",
+    "RAZORPAY_KEY_SECRET": "benchmark",
+}
+
+
+class LatencyCursor:
+    """Cursor proxy that charges one round trip when results are fetched."""
+
+    def __init__(self, cursor, database):
+        self._cursor = cursor
+        self._database = database
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return self if result is self._cursor else result
+
+        return chained
+
+    async def to_list(self, *args, **kwargs):
+        await self._database.round_trip()
+        return await self._cursor.to_list(*args, **kwargs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not getattr(self, "_started", False):
+            self._started = True
+            await self._database.round_trip()
+        return await self._cursor.__anext__()
+
+
+class LatencyCollection:
+    """Collection proxy that delays every command by the configured RTT."""
+
+    _CURSOR_METHODS = {"find", "aggregate", "list_indexes"}
+
+    def __init__(self, collection, database):
+        self._collection = collection
+        self._database = database
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in self._CURSOR_METHODS:
+            def cursor_method(*args, **kwargs):
+                try:
+                    return LatencyCursor(attr(*args, **kwargs), self._database)
+                except NotImplementedError as e:
+                    # mongomock lacks some stages (e.g. $indexStats); fail the
+                    # way a server without them does
+                    raise OperationFailure(str(e)) from e
+            return cursor_method
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def command(*args, **kwargs):
+            await self._database.round_trip()
+            return await attr(*args, **kwargs)
+
+        return command
+
+
+class LatencyDatabase:
+    """Database proxy that counts and delays round trips to the server."""
+
+    def __init__(self, database, rtt_ms: float = 2.0):
+        self._database = database
+        self.rtt = rtt_ms / 1000.0
+        self.round_trips = 0
+
+    async def round_trip(self):
+        self.round_trips += 1
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return LatencyCollection(getattr(self._database, name), self)
+
+    def __getitem__(self, name):
+        return LatencyCollection(self._database[name], self)
+
+
+def load_server(rtt_ms: float = 2.0, mongo_url: Optional[str] = None):
+    """Import server.py against an in-memory database (or mongo_url) and return the module."""
+    for key, value in _ENV_DEFAULTS.items():
+        os.environ.setdefault(key, value)
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient as client_class
+        client_args = (mongo_url,)
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient as client_class
+        except ImportError:
+            sys.exit("mongomock-motor is required: pip install mongomock-motor httpx")
+        client_args = ()
+
+    import server
+
+    server.client = client_class(*client_args)
+    server.db = LatencyDatabase(server.client[os.environ["DB_NAME"]], rtt_ms)
+    return server
+
+
+def make_client(server):
+    """Return an httpx client bound to the app without opening a socket."""
+    import httpx
+
+    transport = httpx.ASGITransport(app=server.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://benchmark")
+
+
+async def create_user(server, role: str = "customer") -> dict:
+    """Insert a user directly and return auth headers for it."""
+    user = server.User(email=f"{role}-{time.time_ns()}@example.com", name="Bench User", role=role)
+    await server.db.users.insert_one({**user.dict(), "hashed_password": "!"})
+    token = server.create_access_token(data={"sub": user.id})
+    return {"id": user.id, "headers": {"Authorization": f"Bearer {token}"}}
+
+
+def summarize(samples_ms):
+    """Return p50/p95/p99 and mean for a list of millisecond samples."""
+    ordered = sorted(samples_ms)
+
+    def pct(p):
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3) if ordered else 0.0,
+        "p50_ms": round(pct(50), 3),
+        "p95_ms": round(pct(95), 3),
+        "p99_ms": round(pct(99), 3),
+    }
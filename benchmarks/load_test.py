@@ -0,0 +1,306 @@
+"""Load-test the API in-process with browse, cart, checkout and admin scenarios.
+
+Runs the FastAPI app inside this process against local stand-ins: an
+in-memory mongomock-motor database (or a local mongod via --mongo-url),
+moto for S3 and the fake Razorpay server. Virtual users loop over weighted
+scenarios for a fixed duration, and the run is reported as JSON with
+throughput and p50/p95/p99 latency per endpoint, so results can be stored
+and compared over time.
+
+Scenarios:
+  browse    categories, hero images, a catalog page, a search, a product
+  cart      batch add, view, change quantity, remove a line
+  checkout  add to cart, create a Razorpay order and place the order (both
+            with Idempotency-Key), then list orders
+  admin     dashboard stats, order CSV export, create / update / delete a
+            product, with an image upload every --image-every runs
+
+Usage: python benchmarks/load_test.py [--users 20] [--duration 30]
+           [--mix browse=60,cart=20,checkout=15,admin=5] [--output report.json]
+
+Requires: pip install mongomock-motor httpx moto
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from harness import create_user, load_server, make_client, summarize
+
+DEFAULT_MIX = "browse=60,cart=20,checkout=15,admin=5"
+SEARCH_TERMS = ["shirt", "cotton", "mug", "premium", "custom", "print"]
+SIZES = ["S", "M", "L", "XL"]
+
+
+def log(message: str) -> None:
+    print(message, file=sys.stderr)
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name.strip()!r}; choose from {', '.join(SCENARIOS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class Recorder:
+    """Collects latency samples and status codes per endpoint label."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.scenarios = defaultdict(int)
+        self.failures = defaultdict(int)
+
+    async def call(self, client, method: str, label: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except Exception as e:
+            log(f"{label}: {type(e).__name__}: {e}")
+            response, status = None, 0
+        self.samples[label].append((time.perf_counter() - started) * 1000)
+        self.statuses[label][status] += 1
+        return response if response is not None and status < 400 else None
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for label in sorted(self.samples):
+            stats = summarize(self.samples[label])
+            statuses = self.statuses[label]
+            endpoints[label] = {
+                **stats,
+                "rps": round(stats["count"] / elapsed, 2),
+                "errors": sum(count for status, count in statuses.items() if status == 0 or status >= 400),
+                "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+            }
+        total = sum(len(samples) for samples in self.samples.values())
+        return {
+            "duration_s": round(elapsed, 2),
+            "total_requests": total,
+            "throughput_rps": round(total / elapsed, 2),
+            "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+            "scenarios": dict(self.scenarios),
+            "failed_scenarios": dict(self.failures),
+            "endpoints": endpoints,
+        }
+
+
+async def browse(ctx, user, rng: random.Random):
+    rec, client = ctx["recorder"], ctx["client"]
+    await rec.call(client, "GET", "GET /api/categories", "/api/categories")
+    await rec.call(client, "GET", "GET /api/hero-images", "/api/hero-images")
+    page = await rec.call(client, "GET", "GET /api/products (page)", "/api/products",
+                          params={"cursor": "", "page_size": 24, "category_id": rng.choice(ctx["category_ids"])})
+    if page is not None and page.json()["next_cursor"]:
+        await rec.call(client, "GET", "GET /api/products (page)", "/api/products",
+                       params={"cursor": page.json()["next_cursor"], "page_size": 24})
+    await rec.call(client, "GET", "GET /api/products (search)", "/api/products",
+                   params={"search": rng.choice(SEARCH_TERMS), "limit": 24})
+    await rec.call(client, "GET", "GET /api/products/{id}", f"/api/products/{rng.choice(ctx['product_ids'])}")
+
+
+async def add_lines(ctx, user, rng: random.Random, lines: int):
+    items = [{"product_id": product_id, "quantity": rng.randint(1, 3), "size": rng.choice(SIZES)}
+             for product_id in rng.sample(ctx["product_ids"], lines)]
+    return await ctx["recorder"].call(ctx["client"], "POST", "POST /api/cart/batch", "/api/cart/batch",
+                                      json={"items": items}, headers=user["headers"])
+
+
+async def cart(ctx, user, rng: random.Random):
+    rec, client, headers = ctx["recorder"], ctx["client"], user["headers"]
+    await add_lines(ctx, user, rng, rng.randint(1, 4))
+    await rec.call(client, "POST", "POST /api/cart", "/api/cart", headers=headers,
+                   json={"user_id": user["id"], "product_id": rng.choice(ctx["product_ids"]), "quantity": 1, "size": "M"})
+    response = await rec.call(client, "GET", "GET /api/cart", "/api/cart", headers=headers)
+    if response is None or not response.json():
+        return
+    lines = response.json()
+    await rec.call(client, "PUT", "PUT /api/cart/{id}", f"/api/cart/{lines[0]['id']}", headers=headers,
+                   params={"quantity": rng.randint(1, 5)})
+    for line in lines[1:]:
+        await rec.call(client, "DELETE", "DELETE /api/cart/{id}", f"/api/cart/{line['id']}", headers=headers)
+
+
+async def checkout(ctx, user, rng: random.Random):
+    rec, client, headers = ctx["recorder"], ctx["client"], user["headers"]
+    await add_lines(ctx, user, rng, rng.randint(1, 3))
+    response = await rec.call(client, "GET", "GET /api/cart", "/api/cart", headers=headers)
+    if response is None:
+        return
+    total = sum(line["product_price"] * line["quantity"] for line in response.json() if line.get("product_price"))
+    await rec.call(client, "POST", "POST /api/create-razorpay-order", "/api/create-razorpay-order",
+                   json={"amount": max(100, int(total * 100))},
+                   headers={**headers, "Idempotency-Key": str(uuid.uuid4())})
+    await rec.call(client, "POST", "POST /api/orders", "/api/orders",
+                   json={"billing_address": "Load Test, Mumbai", "phone": "9999999999"},
+                   headers={**headers, "Idempotency-Key": str(uuid.uuid4())})
+    await rec.call(client, "GET", "GET /api/orders", "/api/orders", headers=headers)
+
+
+async def admin(ctx, user, rng: random.Random):
+    rec, client, headers = ctx["recorder"], ctx["client"], ctx["admin"]["headers"]
+    await rec.call(client, "GET", "GET /api/dashboard/stats", "/api/dashboard/stats", headers=headers)
+    await rec.call(client, "GET", "GET /api/orders/export", "/api/orders/export", headers=headers,
+                   params={"format": "csv"})
+    created = await rec.call(client, "POST", "POST /api/products", "/api/products", headers=headers,
+                             json=product_payload(rng, rng.choice(ctx["category_ids"])))
+    if created is None:
+        return
+    product = created.json()
+    ctx["admin_runs"] += 1
+    if ctx["image_every"] and ctx["admin_runs"] % ctx["image_every"] == 0:
+        await rec.call(client, "POST", "POST /api/products/{id}/add-image", f"/api/products/{product['id']}/add-image",
+                       headers=headers, files={"file": ("load.jpg", make_image(rng), "image/jpeg")})
+    await rec.call(client, "PUT", "PUT /api/products/{id}", f"/api/products/{product['id']}", headers=headers,
+                   json={**product_payload(rng, product["category_id"]), "title": product["title"] + " (updated)"})
+    await rec.call(client, "DELETE", "DELETE /api/products/{id}", f"/api/products/{product['id']}", headers=headers)
+
+
+SCENARIOS = {"browse": browse, "cart": cart, "checkout": checkout, "admin": admin}
+
+
+def product_payload(rng: random.Random, category_id: str) -> dict:
+    noun = rng.choice(["Shirt", "Mug", "Hoodie", "Poster", "Cap"])
+    return {
+        "title": f"{rng.choice(['Custom', 'Premium', 'Cotton', 'Printed'])} {noun} {rng.randint(1, 10**6)}",
+        "description": f"A {noun.lower()} for load testing with custom print support and quality material.",
+        "category_id": category_id,
+        "price": round(rng.uniform(199, 2999), 2),
+        "sizes": SIZES,
+        "is_customizable": rng.random() < 0.5,
+        "quantity": 10**6,
+    }
+
+
+def make_image(rng: random.Random) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), tuple(rng.randint(0, 255) for _ in range(3))).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+async def seed(server, args, rng: random.Random) -> dict:
+    categories = [server.Category(name=name, description=f"{name} products")
+                  for name in ["T-Shirts", "Mugs", "Hoodies", "Posters"]]
+    await server.db.categories.insert_many([category.dict() for category in categories])
+    products = [server.Product(**product_payload(rng, rng.choice(categories).id)) for _ in range(args.products)]
+    await server.db.products.insert_many([product.dict() for product in products])
+    await server.touch_catalog()
+    await server.rebuild_stats(server.db)
+    await server.create_db_indexes()
+    return {
+        "category_ids": [category.id for category in categories],
+        "product_ids": [product.id for product in products],
+        "admin": await create_user(server, role="admin"),
+        "users": [await create_user(server) for _ in range(args.users)],
+    }
+
+
+async def virtual_user(ctx, user, weights: dict, deadline: float, rng: random.Random):
+    names, scenario_weights = list(weights), list(weights.values())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, scenario_weights)[0]
+        try:
+            await SCENARIOS[name](ctx, user, rng)
+            ctx["recorder"].scenarios[name] += 1
+        except Exception as e:
+            ctx["recorder"].failures[name] += 1
+            log(f"{name} scenario failed: {type(e).__name__}: {e}")
+
+
+async def run(args, weights: dict) -> dict:
+    server = load_server(args.rtt_ms, mongo_url=args.mongo_url)
+    server.storage.client.create_bucket(Bucket=server.storage.bucket)
+    rng = random.Random(args.seed)
+    log(f"Seeding {args.products} products and {args.users} users...")
+    ctx = await seed(server, args, rng)
+    ctx.update(recorder=Recorder(), image_every=args.image_every, admin_runs=0)
+
+    log(f"Running {args.users} virtual users for {args.duration:.0f}s ({args.mix})...")
+    try:
+        async with make_client(server) as client:
+            ctx["client"] = client
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(*(
+                virtual_user(ctx, user, weights, deadline, random.Random(rng.random()))
+                for user in ctx["users"]
+            ))
+            elapsed = time.perf_counter() - started
+    finally:
+        if args.mongo_url:
+            await server.client.drop_database(os.environ["DB_NAME"])
+        server.shutdown_executors()
+
+    return {
+        "started_at": datetime.utcnow().isoformat() + "Z",
+        "config": {
+            "users": args.users, "duration_s": args.duration, "mix": weights, "products": args.products,
+            "rtt_ms": args.rtt_ms, "database": "mongod" if args.mongo_url else "mongomock",
+            "razorpay_latency_ms": args.razorpay_latency_ms, "image_every": args.image_every, "seed": args.seed,
+        },
+        **ctx["recorder"].report(elapsed),
+        "executors": server.executor_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. browse=60,checkout=40")
+    parser.add_argument("--products", type=int, default=500, help="products seeded into the catalog")
+    parser.add_argument("--rtt-ms", type=float, default=1.0, help="simulated Mongo round-trip time")
+    parser.add_argument("--mongo-url", help="use this (local, disposable) mongod instead of mongomock")
+    parser.add_argument("--razorpay-latency-ms", type=float, default=50, help="fake Razorpay response delay")
+    parser.add_argument("--image-every", type=int, default=10, help="upload an image every N admin runs (0: never)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+
+    try:
+        from moto import mock_aws
+    except ImportError:
+        sys.exit("moto is required: pip install moto")
+    from fake_razorpay import start_fake_razorpay
+
+    # moto logs every request it lets through to the fake Razorpay server
+    logging.getLogger("responses").setLevel(logging.WARNING)
+    razorpay_url, razorpay_server = start_fake_razorpay(latency_ms=args.razorpay_latency_ms)
+    # server.py builds its S3 and Razorpay clients at import, so point them at the stand-ins first
+    os.environ["RAZORPAY_BASE_URL"] = razorpay_url
+    os.environ["S3_PUBLIC_URL_BASE"] = "https://illustra-loadtest.example.com"
+    os.environ["DB_NAME"] = f"illustra_loadtest_{uuid.uuid4().hex[:8]}"
+    # The server logs with print(); keep stdout for the report
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args, weights))
+    razorpay_server.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        log(f"Report written to {args.output}")
+    else:
+        print(output)
+    log(f"{report['total_requests']} requests, {report['throughput_rps']} req/s, {report['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Measure catalog-read latency while a login storm is in progress.
+
+Runs a steady stream of GET /api/products requests, first on an idle
+server and then while many clients log in at once. With bcrypt running in
+the password executor, catalog p99 should barely move during the storm.
+Pass --blocking to run bcrypt inline on the event loop for comparison.
+
+Usage: python benchmarks/login_storm.py [--logins 40] [--login-concurrency 20] [--blocking]
+"""
+import argparse
+import asyncio
+import time
+
+from harness import load_server, make_client, summarize
+
+EMAIL = "storm@example.com"
+PASSWORD = "storm-password"
+
+
+class InlineExecutor:
+    """Stand-in for the password executor that blocks the event loop."""
+
+    async def run(self, fn, *args):
+        return fn(*args)
+
+
+async def catalog_reader(client, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/products", params={"limit": 24})
+        samples.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        await asyncio.sleep(0.005)
+
+
+async def measure_catalog(client, duration: float, readers: int, load=None):
+    stop = asyncio.Event()
+    samples = []
+    tasks = [asyncio.create_task(catalog_reader(client, stop, samples)) for _ in range(readers)]
+    started = time.perf_counter()
+    if load is not None:
+        await load
+    else:
+        await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*tasks)
+    return summarize(samples), elapsed
+
+
+async def login_storm(client, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            response = await client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+            response.raise_for_status()
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+
+
+async def run(args):
+    server = load_server(args.rtt_ms)
+    if args.blocking:
+        server.password_executor = InlineExecutor()
+
+    async with make_client(server) as client:
+        await client.post("/api/initialize-demo-data")
+        response = await client.post("/api/auth/register",
+                                     json={"email": EMAIL, "name": "Storm", "password": PASSWORD})
+        response.raise_for_status()
+
+        idle, _ = await measure_catalog(client, args.idle_seconds, args.readers)
+        storm, elapsed = await measure_catalog(
+            client, None, args.readers, login_storm(client, args.logins, args.login_concurrency))
+
+    mode = "inline bcrypt (blocking)" if args.blocking else "password executor"
+    print(f"mode: {mode}; {args.logins} logins in {elapsed:.2f}s")
+    print(f"{'phase':>8} {'reads':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for phase, stats in (("idle", idle), ("storm", storm)):
+        print(f"{phase:>8} {stats['count']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rtt-ms", type=float, default=1.0, help="simulated Mongo round-trip time")
+    parser.add_argument("--logins", type=int, default=40, help="total logins in the storm")
+    parser.add_argument("--login-concurrency", type=int, default=20, help="concurrent login clients")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent catalog readers")
+    parser.add_argument("--idle-seconds", type=float, default=3.0, help="length of the idle baseline")
+    parser.add_argument("--blocking", action="store_true", help="run bcrypt on the event loop")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
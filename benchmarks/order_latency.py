@@ -0,0 +1,63 @@
+"""Benchmark POST /api/orders latency against cart size.
+
+Seeds a cart with 1..100 lines and times order creation. With pricing done
+through a single bulk product fetch, latency and round trips should stay
+flat as the cart grows instead of rising by one RTT per line.
+
+Usage: python benchmarks/order_latency.py [--rtt-ms 2] [--repeat 20]
+"""
+import argparse
+import asyncio
+import time
+
+from harness import create_user, load_server, make_client, summarize
+
+CART_SIZES = [1, 5, 10, 25, 50, 100]
+
+
+async def seed_products(server, count: int):
+    products = [
+        server.Product(title=f"Bench Product {i}", description="Benchmark item",
+                       category_id="bench", price=100.0 + i, quantity=1_000_000)
+        for i in range(count)
+    ]
+    await server.db.products.insert_many([product.dict() for product in products])
+    return products
+
+
+async def run(rtt_ms: float, repeat: int):
+    server = load_server(rtt_ms)
+    products = await seed_products(server, max(CART_SIZES))
+    user = await create_user(server)
+
+    print(f"{'lines':>6} {'p50 ms':>9} {'p95 ms':>9} {'round trips':>12}")
+    async with make_client(server) as client:
+        for lines in CART_SIZES:
+            samples = []
+            trips = 0
+            for _ in range(repeat):
+                await server.db.cart_items.insert_many([
+                    server.CartItem(user_id=user["id"], product_id=product.id, quantity=1, size="M").dict()
+                    for product in products[:lines]
+                ])
+                before = server.db.round_trips
+                started = time.perf_counter()
+                response = await client.post("/api/orders", headers=user["headers"],
+                                             json={"billing_address": "Bench", "phone": "0"})
+                samples.append((time.perf_counter() - started) * 1000)
+                trips = server.db.round_trips - before
+                response.raise_for_status()
+            stats = summarize(samples)
+            print(f"{lines:>6} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {trips:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rtt-ms", type=float, default=2.0, help="simulated Mongo round-trip time")
+    parser.add_argument("--repeat", type=int, default=20, help="orders timed per cart size")
+    args = parser.parse_args()
+    asyncio.run(run(args.rtt_ms, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Compare the model-validating and fast JSON paths for the product list.
+
+Builds N stored product documents and encodes them two ways:
+
+  models  Product(**doc) per document, then FastAPI's response_model
+          validation and JSONResponse rendering (what the route used to do)
+  fast    serialization.to_schema() per document, then serialization.dumps()
+
+Both paths must produce the same JSON; the script checks that before timing.
+A final row times GET /api/products end to end through the ASGI app.
+
+Usage: python benchmarks/serialization.py [--products 10000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from harness import load_server, make_client, summarize
+
+
+def make_documents(server, count: int) -> List[dict]:
+    documents = []
+    for i in range(count):
+        product = server.Product(
+            title=f"Bench Product {i}", description="Benchmark item " * 8, category_id="bench",
+            price=100.0 + i, sizes=["S", "M", "L", "XL"],
+            images=[f"https://example.com/products/{i}-{n}.jpg" for n in range(3)], quantity=10,
+        )
+        documents.append(product.dict())
+    return documents
+
+
+async def encode_with_models(server, field, documents: List[dict]) -> bytes:
+    models = [server.Product(**document) for document in documents]
+    content = await serialize_response(field=field, response_content=models)
+    return JSONResponse(content).body
+
+
+def encode_fast(server, documents: List[dict]) -> bytes:
+    return server.dumps([server.to_schema(document, server.Product) for document in documents])
+
+
+def time_ms(fn, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def run(count: int, repeat: int):
+    server = load_server(rtt_ms=0)
+    documents = make_documents(server, count)
+    field = create_response_field("response", List[server.Product])
+
+    legacy = await encode_with_models(server, field, documents)
+    fast = encode_fast(server, documents)
+    if json.loads(legacy) != json.loads(fast):
+        raise SystemExit("fast path output differs from the model path")
+
+    model_samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await encode_with_models(server, field, documents)
+        model_samples.append((time.perf_counter() - started) * 1000)
+    fast_samples = time_ms(lambda: encode_fast(server, documents), repeat)
+
+    await server.db.products.insert_many([dict(document) for document in documents])
+    http_samples = []
+    async with make_client(server) as client:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = await client.get("/api/products", headers={"Accept-Encoding": "identity"})
+            http_samples.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+    print(f"{count} products, {len(fast) / 1024:.0f} KB of JSON")
+    print(f"{'path':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, samples in (("models", model_samples), ("fast", fast_samples), ("http", http_samples)):
+        stats = summarize(samples)
+        print(f"{name:>8} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000, help="number of products to encode")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per path")
+    args = parser.parse_args()
+    asyncio.run(run(args.products, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""Shared setup for tests that run the app in-process through benchmarks/harness.py."""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+for directory in (ROOT / "benchmarks", ROOT / "backend"):
+    if str(directory) not in sys.path:
+        sys.path.insert(0, str(directory))
+
+from harness import load_server  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    """server.py on a fresh in-memory database with its indexes, no RTT."""
+    pytest.importorskip("mongomock_motor")
+    server = load_server(rtt_ms=0)
+    asyncio.run(server.ensure_indexes(server.db))
+    server.product_search.ready = False
+    return server
@@ -0,0 +1,182 @@
+"""Checkout stock reservation: no overselling, and every rollback path restores stock.
+
+Runs the app in-process through the benchmark harness (mongomock-motor, no
+RTT). Reservations tag each product they decrement with the order id, and a
+rollback only returns stock to tagged products, so besides quantities the
+tests check that no tags are left behind.
+"""
+import asyncio
+from contextlib import contextmanager
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+pytest.importorskip("mongomock_motor")
+
+import checkout_concurrency  # noqa: E402
+from harness import create_user, load_server, make_client  # noqa: E402
+
+ORDER = {"billing_address": "Test", "phone": "0"}
+
+
+async def setup_checkout(stocks):
+    """Fresh database with one product per stock level, all in one buyer's cart.
+
+    No indexes are built: reservations must not depend on them.
+    """
+    server = load_server(rtt_ms=0)
+    products = [
+        server.Product(title=f"Product {index}", description="Test", category_id="test", price=10.0, quantity=stock)
+        for index, stock in enumerate(stocks)
+    ]
+    await server.db.products.insert_many([product.dict() for product in products])
+    user = await create_user(server)
+    await server.db.cart_items.insert_many([
+        server.CartItem(user_id=user["id"], product_id=product.id, quantity=2, size="M").dict()
+        for product in products
+    ])
+    return server, user, [product.id for product in products]
+
+
+async def stock_of(server, product_ids):
+    products = [await server.db.products.find_one({"id": product_id}) for product_id in product_ids]
+    assert not any(product.get("reservations") for product in products if product)
+    return [product and product["quantity"] for product in products]
+
+
+@contextmanager
+def patched_collection(server, name, **methods):
+    """Replace methods of one collection on server.db for the duration of the block."""
+    real_db = server.db
+    collection = getattr(real_db, name)
+
+    class Collection:
+        def __getattr__(self, attr):
+            return methods.get(attr) or getattr(collection, attr)
+
+    class Database:
+        def __getattr__(self, attr):
+            return Collection() if attr == name else getattr(real_db, attr)
+
+    server.db = Database()
+    try:
+        yield
+    finally:
+        server.db = real_db
+
+
+async def catalog_token(server):
+    version = await server.db.catalog_versions.find_one({"_id": "products"})
+    return version and version["token"]
+
+
+def test_concurrent_checkouts_do_not_oversell():
+    buyers, stock = 30, 10
+    result = asyncio.run(checkout_concurrency.run(buyers, stock, rtt_ms=0))
+    assert result["succeeded"] == stock
+    assert result["rejected"] == buyers - stock
+    assert checkout_concurrency.adds_up(result, buyers, stock)
+
+
+def test_insufficient_stock_partway_releases_earlier_lines():
+    async def scenario():
+        server, user, product_ids = await setup_checkout([10, 1, 10])
+        token = await catalog_token(server)
+        async with make_client(server) as client:
+            response = await client.post("/api/orders", json=ORDER, headers=user["headers"])
+        assert response.status_code == 409
+        assert await stock_of(server, product_ids) == [10, 1, 10]
+        assert await server.db.orders.count_documents({}) == 0
+        assert await server.db.cart_items.count_documents({"user_id": user["id"]}) == 3
+        assert await catalog_token(server) != token
+        released = await server.db.products.find_one({"id": product_ids[0]})
+        assert released["updated_at"] > released["created_at"]
+
+    asyncio.run(scenario())
+
+
+def test_product_deleted_mid_checkout_is_not_recreated():
+    async def scenario():
+        server, user, product_ids = await setup_checkout([10, 10])
+        priced = server.get_products_by_ids
+
+        async def price_then_delete(ids, fields):
+            products = await priced(ids, fields)
+            await server.db.products.delete_one({"id": product_ids[1]})
+            return products
+
+        server.get_products_by_ids = price_then_delete
+        try:
+            async with make_client(server) as client:
+                response = await client.post("/api/orders", json=ORDER, headers=user["headers"])
+        finally:
+            server.get_products_by_ids = priced
+        assert response.status_code == 409
+        assert await stock_of(server, product_ids) == [10, None]
+        assert await server.db.products.count_documents({}) == 1
+        assert await server.db.orders.count_documents({}) == 0
+
+    asyncio.run(scenario())
+
+
+def test_failed_order_insert_releases_stock():
+    async def scenario():
+        server, user, product_ids = await setup_checkout([10, 10])
+
+        async def insert_one(document):
+            raise RuntimeError("insert failed")
+
+        with patched_collection(server, "orders", insert_one=insert_one):
+            async with make_client(server) as client:
+                with pytest.raises(RuntimeError, match="insert failed"):
+                    await client.post("/api/orders", json=ORDER, headers=user["headers"])
+        assert await stock_of(server, product_ids) == [10, 10]
+        assert await server.db.orders.count_documents({}) == 0
+
+    asyncio.run(scenario())
+
+
+def test_write_concern_error_releases_applied_lines():
+    async def scenario():
+        server, user, product_ids = await setup_checkout([10, 10])
+        products = server.db.products
+        calls = 0
+
+        async def bulk_write(operations, **kwargs):
+            nonlocal calls
+            calls += 1
+            result = await products.bulk_write(operations, **kwargs)
+            if calls == 1:
+                # The reservation applied, but the write concern was not satisfied
+                raise BulkWriteError({"writeErrors": [], "writeConcernErrors": [
+                    {"code": 64, "errmsg": "waiting for replication timed out"}]})
+            return result
+
+        with patched_collection(server, "products", bulk_write=bulk_write):
+            async with make_client(server) as client:
+                with pytest.raises(BulkWriteError):
+                    await client.post("/api/orders", json=ORDER, headers=user["headers"])
+        assert await stock_of(server, product_ids) == [10, 10]
+        assert await server.db.orders.count_documents({}) == 0
+
+    asyncio.run(scenario())
+
+
+def test_non_positive_cart_quantity_is_rejected():
+    async def scenario():
+        server, user, product_ids = await setup_checkout([5])
+        # Written directly: the cart endpoints no longer accept it
+        await server.db.cart_items.update_one({"user_id": user["id"]}, {"$set": {"quantity": -50}})
+        async with make_client(server) as client:
+            response = await client.post("/api/orders", json=ORDER, headers=user["headers"])
+        assert response.status_code == 400
+        assert await stock_of(server, product_ids) == [5]
+        assert await server.db.orders.count_documents({}) == 0
+
+    asyncio.run(scenario())
+
+
+def test_reserve_stock_refuses_non_positive_quantities():
+    server = load_server(rtt_ms=0)
+    with pytest.raises(ValueError):
+        asyncio.run(server.reserve_stock("order", {"any-product": -1}, {}))
@@ -0,0 +1,131 @@
+"""Accept-Encoding negotiation and response compression in CompressionMiddleware."""
+import asyncio
+import gzip
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import compression
+from compression import CompressionMiddleware
+
+httpx = pytest.importorskip("httpx")
+
+LARGE = {"items": [{"id": index, "title": "Custom Cotton T-Shirt"} for index in range(200)]}
+
+
+def large(request):
+    return JSONResponse(LARGE, headers={"ETag": '"v1"'})
+
+
+def small(request):
+    return JSONResponse({"ok": True})
+
+
+def image(request):
+    return Response(b"\x89PNG" + b"\0" * 4096, media_type="image/png")
+
+
+def not_modified(request):
+    return Response(status_code=304, headers={"ETag": '"v1"'})
+
+
+def stream(request):
+    async def lines():
+        for index in range(100):
+            yield json.dumps({"line": index}).encode() + b"\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+app = CompressionMiddleware(Starlette(routes=[
+    Route("/large", large), Route("/small", small), Route("/image", image),
+    Route("/not-modified", not_modified), Route("/stream", stream),
+]))
+
+
+def get(path, accept_encoding):
+    """Fetch path and return (response, raw body chunks)."""
+    async def fetch():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+                return response, [chunk async for chunk in response.aiter_raw()]
+    return asyncio.run(fetch())
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0.2, gzip;q=0", "br"),
+    ("identity", None),
+    ("", None),
+    ("GZIP;q=0.8", "gzip"),
+    ("gzip;q=bogus", None),
+])
+def test_choose_encoding(monkeypatch, header, expected):
+    monkeypatch.setattr(compression, "brotli", object())
+    assert CompressionMiddleware(app).choose_encoding(header) == expected
+
+
+def test_gzip_only_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert CompressionMiddleware(app).choose_encoding("br, gzip;q=0.1") == "gzip"
+    assert CompressionMiddleware(app).choose_encoding("br") is None
+
+
+def test_large_json_is_gzipped_with_weak_etag():
+    response, chunks = get("/large", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert int(response.headers["content-length"]) == len(b"".join(chunks))
+    assert json.loads(gzip.decompress(b"".join(chunks))) == LARGE
+
+
+def test_brotli_when_preferred():
+    brotli = pytest.importorskip("brotli")
+    response, chunks = get("/large", "gzip;q=0.5, br")
+    assert response.headers["content-encoding"] == "br"
+    assert json.loads(brotli.decompress(b"".join(chunks))) == LARGE
+
+
+def test_identity_still_varies_on_accept_encoding():
+    response, chunks = get("/large", "identity")
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == '"v1"'
+    assert json.loads(b"".join(chunks)) == LARGE
+
+
+@pytest.mark.parametrize("path", ["/small", "/image", "/not-modified"])
+def test_small_binary_and_304_responses_are_not_compressed(path):
+    response, _ = get(path, "gzip")
+    assert "content-encoding" not in response.headers
+
+
+def test_streaming_response_is_compressed_incrementally():
+    # Called directly: the httpx transport would join the chunks
+    messages = []
+
+    async def receive():
+        await asyncio.Event().wait()  # the client never disconnects
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream", "query_string": b"",
+             "headers": [(b"accept-encoding", b"gzip")], "scheme": "http", "server": ("test", 80)}
+    asyncio.run(app(scope, receive, send))
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    chunks = [message["body"] for message in messages[1:]]
+    assert len(chunks) > 1 and all(chunks[:-1])
+    lines = gzip.decompress(b"".join(chunks)).splitlines()
+    assert [json.loads(line)["line"] for line in lines] == list(range(100))
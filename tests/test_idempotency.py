@@ -0,0 +1,147 @@
+"""Idempotency-Key handling on POST /api/orders and the claim records behind it."""
+import asyncio
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from harness import create_user, make_client
+from idempotency import COMPLETED, IN_PROGRESS, claim_key, complete_key, release_key
+
+ORDER = {"billing_address": "Test", "phone": "0"}
+
+
+async def fill_cart(server, user, stock=10):
+    product = server.Product(title="Product", description="Test", category_id="test", price=10.0, quantity=stock)
+    await server.db.products.insert_one(product.dict())
+    await server.db.cart_items.insert_one(
+        server.CartItem(user_id=user["id"], product_id=product.id, quantity=2, size="M").dict())
+    return product.id
+
+
+def with_key(user, key):
+    return {**user["headers"], "Idempotency-Key": key}
+
+
+def test_repeat_replays_the_stored_response(server):
+    async def scenario():
+        user = await create_user(server)
+        product_id = await fill_cart(server, user)
+        async with make_client(server) as client:
+            first = await client.post("/api/orders", json=ORDER, headers=with_key(user, "order-1"))
+            await fill_cart(server, user)  # a real repeat would otherwise find the cart empty
+            repeat = await client.post("/api/orders", json=ORDER, headers=with_key(user, "order-1"))
+        assert first.status_code == repeat.status_code == 200
+        assert "idempotent-replayed" not in first.headers
+        assert repeat.headers["idempotent-replayed"] == "true"
+        assert repeat.json() == first.json()
+        assert await server.db.orders.count_documents({}) == 1
+        assert (await server.db.products.find_one({"id": product_id}))["quantity"] == 8
+
+    asyncio.run(scenario())
+
+
+def test_key_reused_for_a_different_payload_is_rejected(server):
+    async def scenario():
+        user = await create_user(server)
+        await fill_cart(server, user)
+        async with make_client(server) as client:
+            await client.post("/api/orders", json=ORDER, headers=with_key(user, "order-1"))
+            other = await client.post("/api/orders", json={**ORDER, "phone": "1"}, headers=with_key(user, "order-1"))
+        assert other.status_code == 422
+        assert await server.db.orders.count_documents({}) == 1
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_duplicate_is_told_to_retry(server):
+    async def scenario():
+        user = await create_user(server)
+        await fill_cart(server, user)
+        place_order = server.place_order
+        started, proceed = asyncio.Event(), asyncio.Event()
+
+        async def held_place_order(*args):
+            started.set()
+            await proceed.wait()
+            return await place_order(*args)
+
+        server.place_order = held_place_order
+        try:
+            async with make_client(server) as client:
+                first = asyncio.create_task(client.post("/api/orders", json=ORDER, headers=with_key(user, "order-1")))
+                await started.wait()
+                duplicate = await client.post("/api/orders", json=ORDER, headers=with_key(user, "order-1"))
+                proceed.set()
+                first = await first
+                repeat = await client.post("/api/orders", json=ORDER, headers=with_key(user, "order-1"))
+        finally:
+            server.place_order = place_order
+        assert duplicate.status_code == 409
+        assert duplicate.headers["retry-after"] == "1"
+        assert first.status_code == 200
+        assert repeat.headers["idempotent-replayed"] == "true"
+        assert await server.db.orders.count_documents({}) == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_request_releases_the_key(server):
+    async def scenario():
+        user = await create_user(server)
+        async with make_client(server) as client:
+            empty = await client.post("/api/orders", json=ORDER, headers=with_key(user, "order-1"))
+            await fill_cart(server, user)
+            retried = await client.post("/api/orders", json=ORDER, headers=with_key(user, "order-1"))
+        assert empty.status_code == 400
+        assert retried.status_code == 200
+        assert "idempotent-replayed" not in retried.headers
+
+    asyncio.run(scenario())
+
+
+def test_stale_holder_cannot_complete_or_release_a_taken_over_claim(server):
+    async def scenario():
+        db = server.db
+        stale, _ = await claim_key(db, "user", "route", "key", "hash")
+        await db.idempotency_keys.update_one(
+            {"key": "key"}, {"$set": {"locked_until": datetime.utcnow() - timedelta(seconds=1)}})
+        current, record = await claim_key(db, "user", "route", "key", "hash")
+        assert record is None and current != stale
+
+        await release_key(db, "user", "route", "key", stale)
+        await complete_key(db, "user", "route", "key", stale, 200, b"stale")
+        assert (await db.idempotency_keys.find_one({"key": "key"}))["state"] == IN_PROGRESS
+
+        await complete_key(db, "user", "route", "key", current, 200, b"current")
+        _, record = await claim_key(db, "user", "route", "key", "hash")
+        assert record["state"] == COMPLETED and record["body"] == b"current"
+
+    asyncio.run(scenario())
+
+
+def test_claim_retries_when_the_holder_releases_before_the_read(server):
+    class ReleasedRace:
+        """The first insert collides with a claim that is released before it can be read."""
+        def __init__(self, collection):
+            self.collection = collection
+            self.inserts = 0
+
+        async def insert_one(self, document):
+            self.inserts += 1
+            if self.inserts == 1:
+                raise DuplicateKeyError("duplicate key")
+            return await self.collection.insert_one(document)
+
+        def __getattr__(self, attr):
+            return getattr(self.collection, attr)
+
+    class Database:
+        idempotency_keys = ReleasedRace(server.db.idempotency_keys)
+
+    async def scenario():
+        claim, record = await claim_key(Database(), "user", "route", "key", "hash")
+        assert claim is not None and record is None
+        assert Database.idempotency_keys.inserts == 2
+        assert (await server.db.idempotency_keys.find_one({"key": "key"}))["claim"] == claim
+
+    asyncio.run(scenario())
@@ -0,0 +1,78 @@
+"""Product search: prefix matching, ranking and the ?search= endpoint."""
+import asyncio
+
+from harness import make_client
+from search_index import ProductSearchIndex, tokenize
+
+
+def product(product_id, title, description="", category_id="shirts", subcategory_id=None):
+    return {"id": product_id, "title": title, "description": description,
+            "category_id": category_id, "subcategory_id": subcategory_id}
+
+
+def build(*products):
+    index = ProductSearchIndex()
+    index.rebuild(products)
+    return index
+
+
+def test_tokenize_ignores_case_accents_and_punctuation():
+    assert tokenize("Café T-Shirt!") == ["cafe", "t", "shirt"]
+    assert tokenize(".*{$where: 1}") == ["where", "1"]
+
+
+def test_every_query_term_must_match_exactly_or_as_prefix():
+    index = build(product("cotton", "Custom Cotton T-Shirt"), product("mug", "Custom Mug"))
+    assert index.search("cot shi") == ["cotton"]
+    assert sorted(index.search("cust")) == ["cotton", "mug"]
+    assert index.search("cotton mug") == []
+    assert index.search("shirts") == []
+
+
+def test_title_matches_outrank_description_matches():
+    index = build(product("described", "Plain Tee", "A cotton tee"), product("titled", "Cotton Tee"))
+    assert index.search("cotton") == ["titled", "described"]
+
+
+def test_exact_matches_outrank_prefix_matches():
+    index = build(product("prefix", "Printed Hoodie"), product("exact", "Print Hoodie"))
+    assert index.search("print") == ["exact", "prefix"]
+
+
+def test_repeated_terms_score_higher():
+    index = build(product("once", "Linen Shirt"), product("twice", "Shirt Shirt"))
+    assert index.search("shirt") == ["twice", "once"]
+
+
+def test_filters_and_updates():
+    index = build(product("a", "Cotton Tee", category_id="shirts"), product("b", "Cotton Mug", category_id="mugs"))
+    assert index.search("cotton", category_id="mugs") == ["b"]
+
+    index.add(product("a", "Linen Tee", category_id="shirts"))
+    assert index.search("cotton") == ["b"]
+    assert index.search("linen") == ["a"]
+
+    index.remove("b")
+    assert index.search("cotton") == []
+    assert len(index) == 1
+
+
+def test_search_endpoint_returns_ranked_products(server):
+    async def scenario():
+        products = [
+            server.Product(title="Plain Tee", description="Soft cotton", category_id="shirts", price=1.0),
+            server.Product(title="Cotton Tee", description="Soft", category_id="shirts", price=1.0),
+            server.Product(title="Mug", description="Ceramic", category_id="mugs", price=1.0),
+        ]
+        await server.db.products.insert_many([item.dict() for item in products])
+        async with make_client(server) as client:
+            ranked = await client.get("/api/products", params={"search": "cot"})
+            page = await client.get("/api/products", params={"search": "cot", "cursor": "", "page_size": 1})
+            following = await client.get("/api/products", params={
+                "search": "cot", "cursor": page.json()["next_cursor"], "page_size": 1})
+        assert [item["title"] for item in ranked.json()] == ["Cotton Tee", "Plain Tee"]
+        assert [item["title"] for item in page.json()["items"]] == ["Cotton Tee"]
+        assert [item["title"] for item in following.json()["items"]] == ["Plain Tee"]
+        assert following.json()["next_cursor"] is None
+
+    asyncio.run(scenario())